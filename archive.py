@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from array import array
+from collections import OrderedDict
+
+
+class ArchivedRanking:
+    """Read-only leaderboard of an archived giveaway, with the same interface as TicketRanking"""
+
+    def __init__(self, entrants, tickets):
+        # Most tickets first, ties in entry order; tickets of 0 are entrants who weren't eligible
+        order = sorted((i for i in range(len(entrants)) if tickets[i] > 0), key=tickets.__getitem__, reverse=True)
+        self.user_ids = array('Q', (int(entrants[i]) for i in order))
+        self.tickets = array('l', (tickets[i] for i in order))
+        self.total = sum(self.tickets)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def page(self, start, count):
+        """[(user_id, tickets)] for ranks start .. start + count - 1"""
+        return list(zip(self.user_ids[start:start + count], self.tickets[start:start + count]))
+
+
+class GiveawayArchive:
+    """Compressed per-guild archive of ended giveaways, kept out of the hot data.
+
+    Each guild has one zip file in `directory` with a deflated JSON member per giveaway:
+    {'giveaway': {...}, 'archived_at', 'entrants': [user_ids], 'tickets': [...]}, tickets
+    aligned with the entrants in entry order as they stood when archived. Reading a
+    giveaway back only decompresses its own member, and the last `cache_size` rankings
+    read are kept in an LRU cache.
+    """
+
+    def __init__(self, directory, cache_size=16):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._rankings = OrderedDict()  # {(guild_id, giveaway_id): ArchivedRanking}
+        self._locks = {}  # {guild_id: asyncio.Lock}
+        self.hits = 0
+        self.misses = 0
+
+    def guild_lock(self, guild_id):
+        """Hold this around a write and around clear_guild so a clear can't be undone by a write in flight"""
+        lock = self._locks.get(guild_id)
+        if lock is None:
+            lock = self._locks[guild_id] = asyncio.Lock()
+        return lock
+
+    def path(self, guild_id):
+        return os.path.join(self.directory, f'{guild_id}.zip')
+
+    def write(self, guild_id, records):
+        """Add {giveaway_id: record} to the guild's archive (blocking, run it in an executor).
+
+        The archive is copied, appended to and swapped in with a rename, so a crash
+        never leaves a half-written zip behind.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(guild_id)
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{guild_id}.', suffix='.zip.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            if os.path.exists(path):
+                shutil.copyfile(path, tmp_path)
+            with zipfile.ZipFile(tmp_path, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+                existing = set(archive.namelist())
+                for giveaway_id, record in records.items():
+                    name = f'{giveaway_id}.json'
+                    if name not in existing:  # Already archived by a run that crashed before saving
+                        archive.writestr(name, json.dumps(record, separators=(',', ':')))
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def read(self, guild_id, giveaway_id):
+        """A giveaway's archived record, or None (blocking)"""
+        try:
+            with zipfile.ZipFile(self.path(guild_id)) as archive:
+                return json.loads(archive.read(f'{giveaway_id}.json'))
+        except (OSError, KeyError):
+            return None
+        except (zipfile.BadZipFile, ValueError) as e:
+            print(f'Archive {self.path(guild_id)} is corrupt, cannot read {giveaway_id}: {e}')
+            return None
+
+    async def ranking(self, guild_id, giveaway_id):
+        """The archived giveaway's ArchivedRanking, loaded off the event loop on a cache miss"""
+        key = (guild_id, giveaway_id)
+        ranking = self._rankings.get(key)
+        if ranking is not None:
+            self.hits += 1
+            self._rankings.move_to_end(key)
+            return ranking
+        self.misses += 1
+        record = await asyncio.get_running_loop().run_in_executor(None, self.read, guild_id, giveaway_id)
+        if record is None:
+            return None
+        ranking = ArchivedRanking(record['entrants'], record['tickets'])
+        self._rankings[key] = ranking
+        while len(self._rankings) > self.cache_size:
+            self._rankings.popitem(last=False)
+        return ranking
+
+    def clear_guild(self, guild_id):
+        """Delete a guild's archive"""
+        for key in [key for key in self._rankings if key[0] == guild_id]:
+            del self._rankings[key]
+        try:
+            os.unlink(self.path(guild_id))
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        return len(self._rankings)
@@ -0,0 +1,126 @@
+"""Minimal stand-ins for the discord.py objects the bot touches, for offline benchmarks"""
+import random
+from types import SimpleNamespace
+
+
+class FakeRole:
+    def __init__(self, role_id, name, guild):
+        self.id = role_id
+        self.name = name
+        self.guild = guild
+        self.members = []
+
+
+class FakeMember:
+    def __init__(self, member_id, guild, bot=False):
+        self.id = member_id
+        self.guild = guild
+        self.bot = bot
+        self.roles = []
+        self.name = f'user{member_id}'
+        self.display_name = f'User {member_id}'
+        self.mention = f'<@{member_id}>'
+        self.display_avatar = SimpleNamespace(url=f'https://cdn.example/avatars/{member_id}.png')
+
+
+class FakeGuild:
+    def __init__(self, guild_id, name='Benchmark Guild'):
+        self.id = guild_id
+        self.name = name
+        self._members = {}
+        self.roles = []
+        self.filesize_limit = 25 * 1024 * 1024
+
+    def add_member(self, member):
+        self._members[member.id] = member
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    @property
+    def member_count(self):
+        return len(self._members)
+
+    async def invites(self):
+        return []
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.mention = f'<#{channel_id}>'
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        return SimpleNamespace(id=random.getrandbits(63), channel=self)
+
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+        self.messages = 0
+
+    def is_done(self):
+        return self._done
+
+    async def send_message(self, content=None, **kwargs):
+        self._done = True
+        self.messages += 1
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+        self.messages += 1
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = 0
+
+    async def send(self, content=None, **kwargs):
+        self.messages += 1
+
+
+class FakeInteraction:
+    def __init__(self, guild, user, channel):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+
+def build_guild(entrants, guild_id=1, bots=0.01, inviters=0.2, role_holders=0.1, role_names=('+EV',), seed=0):
+    """A guild with `entrants` members, a share of bots, bonus role holders and invite counts.
+
+    Returns (guild, invite_data) where invite_data is the guild's {user_id: {...}} section
+    in the bot's saved format.
+    """
+    rng = random.Random(seed)
+    guild = FakeGuild(guild_id)
+    for i, name in enumerate(role_names):
+        guild.roles.append(FakeRole(guild_id * 1000 + i, name, guild))
+
+    invite_data = {}
+    for i in range(entrants):
+        member = FakeMember(10 ** 17 + i, guild, bot=rng.random() < bots)
+        guild.add_member(member)
+        if guild.roles and rng.random() < role_holders:
+            role = rng.choice(guild.roles)
+            member.roles.append(role)
+            role.members.append(member)
+        if rng.random() < inviters:
+            invite_data[str(member.id)] = {
+                'invites': rng.randint(1, 8),
+                'manual_bonus': rng.choice((0, 0, 0, 1, 2)),
+            }
+    return guild, invite_data
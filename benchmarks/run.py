@@ -0,0 +1,254 @@
+"""Offline benchmarks for the bot's hot paths.
+
+Imports bot.py against fake guilds, members, roles and interactions (benchmarks/fakes.py)
+and times entry bursts, ticket lookups, both draw paths, leaderboards and saves at
+several entrant counts. Data files are written to a temporary directory.
+
+    python benchmarks/run.py                      # 1k, 10k and 100k entrants
+    python benchmarks/run.py --sizes 1000 --only draw,leaderboard
+    python benchmarks/run.py --json results.json  # keep numbers to compare later
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeChannel, FakeInteraction, build_guild
+from records import Giveaway, load_invites
+
+GIVEAWAY_ID = 'bench'
+
+
+class Result:
+    def __init__(self, scenario, entrants, latencies, peak_bytes):
+        latencies = sorted(latencies)
+        self.scenario = scenario
+        self.entrants = entrants
+        self.ops = len(latencies)
+        total = sum(latencies)
+        self.ops_per_sec = self.ops / total if total else float('inf')
+        self.p50 = latencies[len(latencies) // 2]
+        self.p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.peak_bytes = peak_bytes
+
+    def as_dict(self):
+        return {
+            'scenario': self.scenario, 'entrants': self.entrants, 'ops': self.ops,
+            'ops_per_sec': self.ops_per_sec, 'p50_ms': self.p50 * 1000, 'p99_ms': self.p99 * 1000,
+            'peak_mb': self.peak_bytes / 1024 / 1024 if self.peak_bytes is not None else None,
+        }
+
+
+async def measure(setup, op, iterations, track_memory):
+    """Time `iterations` calls of op(i) after setup(); then repeat under tracemalloc for peak memory"""
+    await setup()
+    latencies = []
+    clock = time.perf_counter
+    for i in range(iterations):
+        started = clock()
+        await op(i)
+        latencies.append(clock() - started)
+
+    peak = None
+    if track_memory:
+        await setup()
+        tracemalloc.start()
+        for i in range(iterations):
+            await op(i)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return latencies, peak
+
+
+class Bench:
+    """Loads a fake guild with `entrants` members into the bot's state"""
+
+    def __init__(self, bot, entrants):
+        self.bot = bot
+        self.entrants = entrants
+        self.guild, guild_invites = build_guild(entrants)
+        self.guild_id = self.guild.id
+        self.channel = FakeChannel(2, self.guild)
+        self.members = self.guild.members
+        self.admin = self.members[0]
+
+        bot.bot.get_guild = {self.guild.id: self.guild}.get
+        bot.bot.get_channel = {self.channel.id: self.channel}.get
+        bot.invite_data[self.guild_id] = load_invites({self.guild_id: guild_invites})[self.guild_id]
+        bot.refresh_bonus_roles(self.guild)
+
+    def reset_giveaway(self, enter_all=True):
+        bot = self.bot
+        bot.giveaway_data[self.guild_id] = {GIVEAWAY_ID: Giveaway.from_json({
+            'prize': 'Benchmark Prize', 'winners': 3, 'active': True,
+            'created_at': '2024-01-01T00:00:00', 'channel_id': self.channel.id,
+        })}
+        bot.entry_index.reset_giveaway(self.guild_id, GIVEAWAY_ID)
+        bot.leaderboard_rankings.pop((self.guild_id, GIVEAWAY_ID), None)
+        bot.snapshot_cache.invalidate(self.guild_id, GIVEAWAY_ID)
+        if enter_all:
+            for member in self.members:
+                bot.entry_index.add(self.guild_id, GIVEAWAY_ID, member.id)
+
+    def interaction(self, user=None):
+        return FakeInteraction(self.guild, user or self.admin, self.channel)
+
+    async def drain_store(self):
+        # Don't let queued replies or journal records pile up across scenarios
+        await self.bot.entry_queue.drain()
+        await self.bot.store.flush()
+
+
+def scenarios(bench, bot):
+    """[(name, setup, op, iterations)] for one entrant count"""
+    n = bench.entrants
+    members = bench.members
+    heavy = max(3, min(50, 200000 // n))  # Fewer repetitions for whole-giveaway operations
+
+    async def setup_burst():
+        bench.reset_giveaway(enter_all=False)
+        await bench.drain_store()
+        bench.button = bot.GiveawayButton('enter', GIVEAWAY_ID)
+
+    async def enter_click(i):
+        await bench.button.callback(bench.interaction(members[i]))
+        await asyncio.sleep(0)  # Let the reply workers send the follow-up
+
+    async def setup_tickets_cold():
+        bench.reset_giveaway()
+        bot.ticket_cache.clear()
+
+    async def setup_tickets_warm():
+        bench.reset_giveaway()
+        for member in members:
+            bot.get_user_tickets(bench.guild.id, member.id, GIVEAWAY_ID)
+
+    async def tickets(i):
+        bot.get_user_tickets(bench.guild.id, members[i].id, GIVEAWAY_ID)
+
+    async def setup_draw():
+        bench.reset_giveaway()
+
+    async def draw_command(i):
+        bot.giveaway_data[bench.guild_id][GIVEAWAY_ID].active = True
+        await bot.end_giveaway.callback(bench.interaction(), GIVEAWAY_ID)
+
+    async def draw_auto(i):
+        bot.giveaway_data[bench.guild_id][GIVEAWAY_ID].active = True
+        await bot.auto_end_giveaway(bench.guild_id, GIVEAWAY_ID, bench.channel)
+
+    async def setup_leaderboard():
+        bench.reset_giveaway()
+
+    async def leaderboard_cold(i):
+        bot.leaderboard_rankings.pop((bench.guild_id, GIVEAWAY_ID), None)
+        bot.snapshot_cache.invalidate(bench.guild_id, GIVEAWAY_ID)
+        await bot.leaderboard.callback(bench.interaction(), GIVEAWAY_ID)
+
+    async def leaderboard_command(i):
+        await bot.leaderboard.callback(bench.interaction(), GIVEAWAY_ID)
+
+    async def setup_paging():
+        bench.reset_giveaway()
+        bench.leaderboard_view = bot.LeaderboardView(bench.guild, 'Benchmark Prize', GIVEAWAY_ID, True)
+        bench.leaderboard_view.get_embed()
+
+    async def page_flip(i):
+        view = bench.leaderboard_view
+        button = view.next_button if (i // 20) % 2 == 0 else view.prev_button
+        await button.callback(bench.interaction())
+
+    def saving(save):
+        async def op(i):
+            save()
+            await bot.store.flush()
+        return op
+
+    async def setup_save():
+        bench.reset_giveaway()
+        await bench.drain_store()
+
+    return [
+        ('enter button burst', setup_burst, enter_click, n),
+        ('get_user_tickets (cold cache)', setup_tickets_cold, tickets, n),
+        ('get_user_tickets (warm cache)', setup_tickets_warm, tickets, n),
+        ('draw via /endgiveaway', setup_draw, draw_command, heavy),
+        ('draw via scheduled end', setup_draw, draw_auto, heavy),
+        ('leaderboard (cold)', setup_leaderboard, leaderboard_cold, heavy),
+        ('leaderboard (repeat /leaderboard)', setup_leaderboard, leaderboard_command, 200),
+        ('leaderboard page flips', setup_paging, page_flip, 200),
+        ('save_entries_data + flush', setup_save, saving(bot.save_entries_data), heavy),
+        ('save_giveaway_data + flush', setup_save, saving(bot.save_giveaway_data), heavy),
+        ('save_invite_data + flush', setup_save, saving(bot.save_invite_data), heavy),
+    ]
+
+
+def print_table(results):
+    header = f"{'scenario':<36} {'entrants':>9} {'ops':>7} {'ops/sec':>12} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>8}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        peak = f'{r.peak_bytes / 1024 / 1024:8.1f}' if r.peak_bytes is not None else f"{'-':>8}"
+        print(f'{r.scenario:<36} {r.entrants:>9} {r.ops:>7} {r.ops_per_sec:>12,.0f} {r.p50 * 1000:>9.3f} {r.p99 * 1000:>9.3f} {peak}')
+
+
+async def run(args):
+    import bot
+    bot.store.start()
+    bot.entry_queue.start()
+    results = []
+    try:
+        for size in args.sizes:
+            bench = Bench(bot, size)
+            for name, setup, op, iterations in scenarios(bench, bot):
+                if args.only and not any(word in name for word in args.only):
+                    continue
+                latencies, peak = await measure(setup, op, iterations, not args.no_memory)
+                result = Result(name, size, latencies, peak)
+                results.append(result)
+                if args.verbose:
+                    print_table([result])
+            bot.giveaway_data.pop(bench.guild_id, None)
+            bot.entry_index.clear_guild(bench.guild_id)
+            bot.guild_tickets_changed(bench.guild_id)
+            await bench.drain_store()
+    finally:
+        await bot.entry_queue.stop()
+        await bot.store.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the giveaway bot against fake Discord objects')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Comma-separated entrant counts')
+    parser.add_argument('--only', default='', help='Comma-separated words; run only scenarios whose name contains one')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass (halves the run time)')
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json', help='Storage backend to save with')
+    parser.add_argument('--json', help='Also write results to this file')
+    parser.add_argument('--verbose', action='store_true', help='Print each result as it finishes')
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(',')]
+    args.only = [word.strip() for word in args.only.split(',') if word.strip()]
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    # bot.py keeps its data files in the working directory when /app/data doesn't exist
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.chdir(tempfile.mkdtemp(prefix='giveaway-bench-'))
+
+    results = asyncio.run(run(args))
+    print_table(results)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump([r.as_dict() for r in results], f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
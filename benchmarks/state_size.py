@@ -0,0 +1,72 @@
+"""Memory held by the bot's loaded data for a multi-guild deployment.
+
+Builds saved-format data for `--guilds` fake guilds of `--members` members (two
+giveaways each, everyone in the first, half in the second), loads it the way the bot
+does on startup and reports the deep size of each in-memory structure, next to the
+same data as plain saved-format dicts.
+
+    python benchmarks/state_size.py --guilds 20 --members 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import build_guild
+
+
+def saved_data(guilds, members):
+    data = {'invites': {}, 'giveaways': {}, 'entries': {}, 'tracking': {}}
+    for g in range(guilds):
+        guild, guild_invites = build_guild(members, guild_id=10 ** 17 + g, seed=g)
+        guild_key = str(guild.id)
+        data['invites'][guild_key] = guild_invites
+        data['giveaways'][guild_key] = {
+            f'{g:04x}{k:04x}': {
+                'active': k == 0, 'prize': 'Prize', 'created_at': '2024-01-01T00:00:00', 'created_by': '1',
+                'channel_id': '2', 'duration_hours': 24, 'end_time': '2030-01-01T00:00:00', 'winners': 1,
+                'prize_distribution': None, 'message_id': '3',
+            }
+            for k in range(2)
+        }
+        user_keys = [str(member.id) for member in guild.members]
+        data['entries'][guild_key] = {f'{g:04x}0000': user_keys, f'{g:04x}0001': user_keys[:members // 2]}
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory used by the bot's loaded data")
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--members', type=int, default=10000, help='Members (and entrants) per guild')
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='giveaway-state-'))
+    import bot
+    import profiling
+
+    data = saved_data(args.guilds, args.members)
+    bot.storage_backend.load = lambda: data
+    started = time.perf_counter()
+    bot.load_data()
+    load_seconds = time.perf_counter() - started
+
+    mib = lambda obj: profiling.deep_sizeof(obj) / 1024 / 1024
+    rows = [
+        ('invites', mib(data['invites']), mib(bot.invite_data)),
+        ('giveaways', mib(data['giveaways']), mib(bot.giveaway_data)),
+        ('entries', mib(data['entries']), mib(bot.entry_index)),
+    ]
+    print(f'{args.guilds} guilds x {args.members} members, loaded in {load_seconds:.2f}s')
+    print(f"{'dataset':<12}{'saved format MiB':>18}{'in memory MiB':>16}")
+    for name, saved, loaded in rows:
+        print(f'{name:<12}{saved:>18.1f}{loaded:>16.1f}')
+    print(f"{'total':<12}{sum(row[1] for row in rows):>18.1f}{sum(row[2] for row in rows):>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
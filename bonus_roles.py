@@ -0,0 +1,85 @@
+def parse_bonus_roles(value):
+    """Parse "RoleName:tickets,Other Role:2" into {role_name: tickets}"""
+    roles = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, _, tickets = item.rpartition(':')
+        if not name:
+            name, tickets = tickets, '1'
+        roles[name.strip()] = int(tickets)
+    return roles
+
+
+class BonusRoleIndex:
+    """Which members hold a bonus role, resolved by role ID once per guild.
+
+    role_names: {guild_id: {role_id: role_name}} - bonus roles matched by name on resolve
+    holders:    {guild_id: {role_id: {user_id}}}
+    bonuses:    {guild_id: {user_id: total role tickets}} - what ticket checks read
+
+    Each configured name counts once per member, even if a guild has several roles with
+    that name.
+
+    resolve() scans the guild once; afterwards member_updated() keeps the sets current
+    from member events, so a role bonus check is a single dict lookup however many bonus
+    roles a guild has.
+    """
+
+    def __init__(self, role_tickets):
+        self.role_tickets = role_tickets  # {role_name: tickets}
+        self.role_names = {}
+        self.holders = {}
+        self.bonuses = {}
+
+    def resolve(self, guild):
+        """(Re)match bonus role names to IDs and rebuild the guild's holder sets"""
+        bonus_roles = [role for role in guild.roles if role.name in self.role_tickets]
+        names = {role.id: role.name for role in bonus_roles}
+        holders = {role.id: {member.id for member in role.members} for role in bonus_roles}
+        held_names = {}
+        for role_id, members in holders.items():
+            for user_id in members:
+                held_names.setdefault(user_id, set()).add(names[role_id])
+        bonuses = {user_id: self._bonus(held) for user_id, held in held_names.items()}
+        self.role_names[guild.id] = names
+        self.holders[guild.id] = holders
+        self.bonuses[guild.id] = bonuses
+
+    def _bonus(self, names):
+        return sum(self.role_tickets[name] for name in names)
+
+    def is_bonus_role(self, role):
+        return role.name in self.role_tickets or role.id in self.role_names.get(role.guild.id, {})
+
+    def role_bonus(self, guild_id, user_id):
+        """Total bonus role tickets a member holds"""
+        return self.bonuses.get(guild_id, {}).get(user_id, 0)
+
+    def member_updated(self, member):
+        """Refresh one member's bonus roles; returns True if their bonus changed"""
+        names = self.role_names.get(member.guild.id)
+        if names is None:
+            return False
+        holders = self.holders[member.guild.id]
+        held = {role.id for role in member.roles if role.id in names}
+        for role_id, members in holders.items():
+            if role_id in held:
+                members.add(member.id)
+            else:
+                members.discard(member.id)
+        return self._set_bonus(member.guild.id, member.id, self._bonus({names[role_id] for role_id in held}))
+
+    def member_removed(self, guild_id, user_id):
+        for members in self.holders.get(guild_id, {}).values():
+            members.discard(user_id)
+        return self._set_bonus(guild_id, user_id, 0)
+
+    def _set_bonus(self, guild_id, user_id, bonus):
+        bonuses = self.bonuses.setdefault(guild_id, {})
+        old = bonuses.get(user_id, 0)
+        if bonus:
+            bonuses[user_id] = bonus
+        else:
+            bonuses.pop(user_id, None)
+        return old != bonus
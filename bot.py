@@ -1,12 +1,36 @@
 import discord
 from discord.ext import commands
-import json
 import os
-import random
 import uuid
 import asyncio
+import atexit
+import hashlib
+import io
+import json
+import time
+import signal
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import persistence
+import storage
+import draw
+from scheduler import GiveawayScheduler
+from invite_tracking import InviteCoordinator
+from entry_index import EntryIndex
+from records import Giveaway, InviteRecord, load_invites, invites_to_json, load_giveaways, giveaways_to_json
+from inviter_map import InviterTracking
+from tickets import TicketCache, TicketRanking, evaluate_entrants
+from archive import GiveawayArchive
+from bonus_roles import BonusRoleIndex, parse_bonus_roles
+from snapshot_cache import SnapshotCache
+from metrics import Metrics, MetricsServer
+from loop_monitor import LoopLagMonitor
+from entry_queue import EntryQueue
+import profiling
+import export
+from sharding import ShardMonitor, parse_shard_ids, shard_for_guild, status_dir
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,80 +42,208 @@ intents.invites = True
 intents.guilds = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)  # Keep prefix for backwards compatibility
+# Sharding: unset runs one plain connection; 'auto' or a number runs an AutoShardedBot.
+# cluster.py sets SHARD_IDS/CLUSTER_ID so each process runs (and stores data for) only its own shards.
+SHARD_COUNT = os.getenv('SHARD_COUNT', '')
+SHARD_IDS = parse_shard_ids(os.getenv('SHARD_IDS', ''))
+CLUSTER_ID = os.getenv('CLUSTER_ID')
+if SHARD_IDS and not SHARD_COUNT.isdigit():
+    # owns_guild() needs the total shard count before login, to load only this process's guilds
+    raise ValueError("SHARD_IDS needs a numeric SHARD_COUNT; 'auto' only learns the shard count after login")
+BotBase = commands.AutoShardedBot if SHARD_COUNT else commands.Bot
+
+def owns_guild(guild_id):
+    """True if this process's shards receive the guild's events"""
+    return not SHARD_IDS or shard_for_guild(guild_id, int(SHARD_COUNT)) in SHARD_IDS
+
+class GiveawayCommandTree(discord.app_commands.CommandTree):
+    async def interaction_check(self, interaction):
+        # Start the latency clock for on_app_command_completion / on_error
+        interaction.extras['started_at'] = time.perf_counter()
+        return True
+    
+    async def on_error(self, interaction, error):
+        command = interaction.command.qualified_name if interaction.command else 'unknown'
+        started_at = interaction.extras.get('started_at')
+        if started_at is not None:
+            metrics.observe('command_seconds', time.perf_counter() - started_at, command=command)
+        metrics.inc('command_errors_total', command=command)
+        await super().on_error(interaction, error)
+
+class GiveawayBot(BotBase):
+    async def setup_hook(self):
+        # One-time initialization; on_ready fires again on every reconnect, so nothing here may live there
+        started = time.perf_counter()
+        load_data()
+        schedule_active_giveaways()
+        log_startup_phase('load data', started)
+        
+        # Start the background saver and make sure a SIGTERM (Railway redeploy) flushes before exit
+        store.start()
+        giveaway_scheduler.start()
+        self.add_dynamic_items(GiveawayButton)  # Buttons of every giveaway message, including ones posted before a restart
+        loop_monitor.start()
+        entry_queue.start()
+        shard_monitor.start()
+        if ARCHIVE_AFTER_DAYS:
+            self.archive_task = self.loop.create_task(archive_loop())
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except (NotImplementedError, RuntimeError):
+            pass  # Signal handlers aren't available on Windows
+        
+        # Commands are global, so in a cluster only the first process syncs them
+        if CLUSTER_ID in (None, '0'):
+            phase = time.perf_counter()
+            await sync_commands_if_changed(self.tree)
+            log_startup_phase('command sync', phase)
+        
+        if METRICS_PORT:
+            await metrics_server.start()
+        
+        # Guild caches only exist once the gateway is ready
+        self.loop.create_task(warm_up_guilds(self, started))
+    
+    async def close(self):
+        # Force pending saves to disk before the connection goes away
+        try:
+            await giveaway_scheduler.stop()
+            await invite_coordinator.close()
+            await store.stop()
+            await metrics_server.close()
+            await loop_monitor.stop()
+            await entry_queue.stop()
+            await shard_monitor.stop()
+            if getattr(self, 'archive_task', None) is not None:
+                self.archive_task.cancel()
+        finally:
+            await super().close()
+
+shard_options = {}
+if SHARD_COUNT and SHARD_COUNT != 'auto':
+    shard_options['shard_count'] = int(SHARD_COUNT)
+    if SHARD_IDS:
+        shard_options['shard_ids'] = SHARD_IDS
+bot = GiveawayBot(command_prefix='!', intents=intents, tree_cls=GiveawayCommandTree, **shard_options)  # Keep prefix for backwards compatibility
 
 # Store invite data
-invites = {}
-invite_data = {}
-giveaway_data = {}  # {guild_id: {giveaway_id: {data}}}
-entries_data = {}  # {guild_id: {giveaway_id: [user_ids]}}
-inviter_tracking = {}  # Track who invited whom: {guild_id: {invited_user_id: inviter_user_id}}
-active_giveaways = {}  # {message_id: giveaway_id} - Map button clicks to giveaway IDs
+invites = {}  # {guild_id: {invite_code: {'uses', 'max_uses', 'inviter_id', 'inviter_bot'}}}
+recently_deleted_invites = {}  # {guild_id: {invite_code: (deleted_at, cached_invite)}} - for invites used up by a join
+# Guild and user IDs are int keys in memory; records.py / EntryIndex convert to the string-keyed JSON format
+invite_data = {}  # {guild_id: {user_id: InviteRecord}}
+giveaway_data = {}  # {guild_id: {giveaway_id: Giveaway}}
+entry_index = EntryIndex()  # Entrants per giveaway (array('Q') in entry order) + reverse user -> giveaways index
+inviter_tracking = InviterTracking()  # Track who invited whom: {guild_id: InviterMap(invited_user_id -> inviter_user_id)}
+active_giveaways = {}  # {message_id: giveaway_id} - Routes clicks on buttons posted before giveaway IDs were in custom IDs
 
 # Files for persistent data
 # Use /app/data for Railway persistent volume, fallback to current directory for local dev
 DATA_DIR = '/app/data' if os.path.exists('/app/data') else '.'
-INVITE_FILE = os.path.join(DATA_DIR, 'invite_data.json')
-GIVEAWAY_FILE = os.path.join(DATA_DIR, 'giveaway_data.json')
-ENTRIES_FILE = os.path.join(DATA_DIR, 'entries_data.json')
 
 # Configuration
 MAX_EXTRA_TICKETS = 5  # Cap at 5 extra tickets from invites
 BONUS_ROLE_NAME = "+EV"  # Role name that gives +1 bonus ticket
 BONUS_ROLE_TICKETS = 1  # Extra tickets for having the bonus role
+# Every bonus role and its tickets, e.g. BONUS_ROLES="+EV:1,Server Booster:2" (defaults to the role above)
+BONUS_ROLES = parse_bonus_roles(os.getenv('BONUS_ROLES', f'{BONUS_ROLE_NAME}:{BONUS_ROLE_TICKETS}'))
+MAX_ROLE_TICKETS = sum(BONUS_ROLES.values())
+BONUS_ROLE_LABEL = f"{next(iter(BONUS_ROLES))} Server Tag" if len(BONUS_ROLES) == 1 else "Bonus Roles"
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')  # 'json' files or a 'sqlite' database in DATA_DIR
+SAVE_INTERVAL = float(os.getenv('SAVE_INTERVAL', '0.25'))  # Seconds between background saves
+JOURNAL_COMPACT_BYTES = int(os.getenv('JOURNAL_COMPACT_BYTES', str(1024 * 1024)))  # Roll the entries journal into a snapshot past this size
+SNAPSHOT_CACHE_TTL = float(os.getenv('SNAPSHOT_CACHE_TTL', '30'))  # Seconds a rendered leaderboard page / status embed is reused
+SNAPSHOT_CACHE_SIZE = int(os.getenv('SNAPSHOT_CACHE_SIZE', '512'))  # Max cached pages across all guilds (LRU beyond that)
+RANKING_CACHE_SIZE = int(os.getenv('RANKING_CACHE_SIZE', '32'))  # Giveaways whose leaderboard ranking is kept up to date (LRU beyond that)
+INVITE_WARMUP_CONCURRENCY = int(os.getenv('INVITE_WARMUP_CONCURRENCY', '5'))  # Guilds whose invites are fetched at once on startup
+COMMAND_HASH_FILE = os.path.join(DATA_DIR, 'command_tree.sha256')  # Hash of the last synced slash commands
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Serve Prometheus metrics on this port (0 = off)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '0.25'))  # Log the blocking stack when the event loop stalls this long
+ENTRY_QUEUE_LIMIT = int(os.getenv('ENTRY_QUEUE_LIMIT', '1000'))  # Queued enter-button replies before new clicks are asked to retry
+ENTRY_REPLY_WORKERS = int(os.getenv('ENTRY_REPLY_WORKERS', '4'))  # Enter-button follow-ups sent concurrently
+LOOP_LAG_REPORT_INTERVAL = float(os.getenv('LOOP_LAG_REPORT_INTERVAL', '300'))  # Seconds between lag percentile log lines
+ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', '7'))  # Days after ending that a giveaway's entries move to the archive (0 = never)
+ARCHIVE_CACHE_SIZE = int(os.getenv('ARCHIVE_CACHE_SIZE', '16'))  # Archived leaderboards kept in memory once opened
+ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')  # One compressed file of ended giveaways per guild
+
+# Saves are batched and written in a worker thread instead of blocking the event loop
+storage_backend = storage.create_backend(
+    STORAGE_BACKEND, DATA_DIR, compact_bytes=JOURNAL_COMPACT_BYTES,
+    guild_filter=owns_guild if SHARD_IDS else None  # Cluster processes only load/save their own guilds
+)
+store = persistence.WriteBehindStore(storage_backend, interval=SAVE_INTERVAL)
+# *_to_json() and EntryIndex.copy() already return new objects, so the store doesn't copy them again
+store.register('invites', lambda: invites_to_json(invite_data), copy=False)
+store.register('giveaways', lambda: giveaways_to_json(giveaway_data), copy=False)
+store.register('entries', entry_index.copy, journaled=True, copy=False, encode=EntryIndex.encode)
+store.register('tracking', inviter_tracking.to_json, journaled=True)
+atexit.register(store.flush_sync)  # Last-resort flush if the process exits without close()
+
+# Latency histograms, counters and gauges for /botstats and the optional Prometheus endpoint
+metrics = Metrics()
+metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT)
+store.on_write = lambda seconds: metrics.observe('storage_write_seconds', seconds)
+
+# Watches event loop lag (which also delays gateway heartbeats) and logs the stack of whatever blocks it
+loop_monitor = LoopLagMonitor(
+    threshold=LOOP_LAG_THRESHOLD,
+    report_interval=LOOP_LAG_REPORT_INTERVAL,
+    on_lag=lambda seconds: metrics.observe('event_loop_lag_seconds', seconds),
+    on_stall=lambda seconds, stack: metrics.inc('event_loop_stalls_total'),
+)
+
+# Gateway events/sec per shard; cluster processes also write it to a status file for cluster.py
+shard_status_path = None
+if CLUSTER_ID is not None:
+    os.makedirs(status_dir(DATA_DIR), exist_ok=True)
+    shard_status_path = os.path.join(status_dir(DATA_DIR), f'cluster-{CLUSTER_ID}.json')
+shard_monitor = ShardMonitor(bot, interval=10, status_path=shard_status_path, cluster_id=CLUSTER_ID)
 
 def load_data():
-    """Load all data from files"""
-    global invite_data, giveaway_data, entries_data
-    
-    if os.path.exists(INVITE_FILE):
-        with open(INVITE_FILE, 'r') as f:
-            invite_data = json.load(f)
-    else:
-        invite_data = {}
-    
-    if os.path.exists(GIVEAWAY_FILE):
-        with open(GIVEAWAY_FILE, 'r') as f:
-            giveaway_data = json.load(f)
-    else:
-        giveaway_data = {}
-    
-    if os.path.exists(ENTRIES_FILE):
-        with open(ENTRIES_FILE, 'r') as f:
-            try:
-                loaded_entries = json.load(f)
-                # Migrate old format to new format
-                entries_data = {}
-                for guild_key, value in loaded_entries.items():
-                    if isinstance(value, list):
-                        # Old format: {guild_id: [user_ids]} - skip it, start fresh
-                        print(f'Detected old entries format for guild {guild_key}, resetting...')
-                        entries_data[guild_key] = {}
-                    elif isinstance(value, dict):
-                        # New format: {guild_id: {giveaway_id: [user_ids]}}
-                        entries_data[guild_key] = value
-                    else:
-                        entries_data[guild_key] = {}
-            except (json.JSONDecodeError, ValueError):
-                print('Error loading entries_data.json, starting fresh...')
-                entries_data = {}
-    else:
-        entries_data = {}
+    """Load all data from the storage backend"""
+    global invite_data, giveaway_data
+    
+    data = storage_backend.load()
+    invite_data = load_invites(data['invites'])
+    giveaway_data = load_giveaways(data['giveaways'])
+    entry_index.load(data['entries'])
+    for guild_id, guild_giveaways in giveaway_data.items():
+        for giveaway_id, giveaway in guild_giveaways.items():
+            if giveaway.archived_at:
+                entry_index.drop_giveaway(guild_id, giveaway_id)  # sqlite lists every giveaway, even without entries
+    inviter_tracking.load(data['tracking'])
+    ticket_cache.clear()
+    leaderboard_rankings.clear()
+    snapshot_cache.clear()
 
+@metrics.timed('save_seconds', dataset='invites')
 def save_invite_data():
-    """Save invite data to file"""
-    with open(INVITE_FILE, 'w') as f:
-        json.dump(invite_data, f, indent=4)
+    """Queue invite data to be saved on the next background flush"""
+    store.mark_dirty('invites')
 
+@metrics.timed('save_seconds', dataset='giveaways')
 def save_giveaway_data():
-    """Save giveaway data to file"""
-    with open(GIVEAWAY_FILE, 'w') as f:
-        json.dump(giveaway_data, f, indent=4)
+    """Queue giveaway data to be saved on the next background flush"""
+    store.mark_dirty('giveaways')
 
+@metrics.timed('save_seconds', dataset='entries')
 def save_entries_data():
-    """Save entries data to file"""
-    with open(ENTRIES_FILE, 'w') as f:
-        json.dump(entries_data, f, indent=4)
+    """Queue a full entries snapshot to be saved on the next background flush"""
+    store.mark_dirty('entries')
+
+def record_entry(guild_id, giveaway_id, user_id):
+    """Add a user to a giveaway's entries and journal just that one entry; False if already entered"""
+    if not entry_index.add(guild_id, giveaway_id, user_id):
+        return False
+    ranking = leaderboard_rankings.get((guild_id, giveaway_id))
+    if ranking is not None:
+        ranking.mark_dirty(user_id)
+    snapshot_cache.invalidate(guild_id, giveaway_id)
+    store.append('entries', {'guild': str(guild_id), 'giveaway': giveaway_id, 'user': str(user_id), 'ts': datetime.now().timestamp()})
+    return True
+
+INVITE_BATCH_WINDOW = 1.0  # Seconds to collect joins so a burst is attributed from one invite fetch
+INVITE_DELETE_WINDOW = 10  # Seconds a deleted invite can still explain a join (max-uses invites are deleted when used up)
 
 async def get_invites(guild):
     """Get all invites for a guild"""
@@ -100,99 +252,169 @@ async def get_invites(guild):
     except:
         return []
 
-async def auto_end_giveaway(guild_key, giveaway_id, delay_seconds, channel):
-    """Automatically end a giveaway after the specified delay"""
-    await asyncio.sleep(delay_seconds)
+def cache_invite(invite):
+    """The parts of an invite needed to attribute joins"""
+    inviter = invite.inviter
+    return {
+        'uses': invite.uses or 0,
+        'max_uses': invite.max_uses or 0,
+        'inviter_id': inviter.id if inviter else None,
+        'inviter_bot': inviter.bot if inviter else False
+    }
+
+def index_invites(invite_list):
+    """Build the code-keyed invite cache for a guild from fetched invites"""
+    return {invite.code: cache_invite(invite) for invite in invite_list}
+
+def find_used_invites(old_invites, new_invites, deleted=None):
+    """Codes whose use count went up between two cached snapshots, as {code: uses_gained}.
+    
+    Invites that vanished one use short of their max_uses were used up by a join.
+    """
+    used = {}
+    for code, new in new_invites.items():
+        old = old_invites.get(code)
+        if old is not None and new['uses'] > old['uses']:
+            used[code] = new['uses'] - old['uses']
+    for code, old in (deleted or {}).items():
+        if code not in new_invites and old['max_uses'] and old['uses'] + 1 >= old['max_uses']:
+            used[code] = 1
+    return used
+
+def pop_used_up_invites(guild_id):
+    """Recently deleted invites that were one use short of their max, i.e. just used up"""
+    deleted = recently_deleted_invites.pop(guild_id, {})
+    cutoff = datetime.now().timestamp() - INVITE_DELETE_WINDOW
+    return {
+        code: cached for code, (deleted_at, cached) in deleted.items()
+        if deleted_at >= cutoff and cached['max_uses'] and cached['uses'] + 1 >= cached['max_uses']
+    }
+
+@metrics.timed('invite_fetch_seconds')
+async def fetch_invite_cache(guild):
+    """Fetch a guild's invites as a code-keyed cache"""
+    return index_invites(await get_invites(guild))
+
+def quick_attribute_joins(guild, members):
+    """Credit a lone join from a just-used-up invite without refetching; True if handled"""
+    if len(members) != 1 or guild.id not in invites:
+        return False
+    used_up = pop_used_up_invites(guild.id)
+    if len(used_up) != 1:
+        # Put them back for the full diff
+        now = datetime.now().timestamp()
+        for code, cached in used_up.items():
+            recently_deleted_invites.setdefault(guild.id, {})[code] = (now, cached)
+        return False
+    credit_invite(guild, next(iter(used_up.values())), members[0])
+    return True
+
+def attribute_joins(guild, members, new_invites):
+    """Attribute a batch of joins from the combined use-count changes since the last snapshot.
     
-    # Check if giveaway is still active
-    if guild_key not in giveaway_data or giveaway_id not in giveaway_data[guild_key]:
-        return
+    Returns how many of the members couldn't be attributed.
+    """
+    old_invites = invites.get(guild.id)
+    used_up = pop_used_up_invites(guild.id)
     
-    if not giveaway_data[guild_key][giveaway_id].get('active'):
-        return  # Already ended
+    # Update cached invites
+    invites[guild.id] = new_invites
+    if old_invites is None:
+        return len(members)
+    
+    used = find_used_invites(old_invites, new_invites, used_up)
+    gained = sum(used.values())
+    if len(used) == 1 and gained >= len(members):
+        # Every member joined with the one invite that moved (extra uses are joins that already left)
+        used_codes = [next(iter(used))] * len(members)
+    elif gained == len(members):
+        # One gained use per member. Per-inviter totals are exact; which member used which of
+        # several codes is a guess, in member order.
+        used_codes = [code for code, count in used.items() for _ in range(count)]
+    else:
+        # Joins and uses don't line up (vanity URL, a join whose use isn't in this snapshot yet,
+        # uses by members we never saw), so any pairing would credit the wrong inviters
+        codes = ', '.join(f'{code} +{count}' for code, count in used.items()) or 'none'
+        print(f'Ambiguous invites in {guild.name}: {len(members)} join(s) but uses gained on {codes}; not attributing')
+        return len(members)
+    
+    for member, code in zip(members, used_codes):
+        credit_invite(guild, new_invites.get(code) or used_up.get(code) or old_invites[code], member)
+    return 0
+
+# One invite fetch per guild at a time, shared by every join in a burst
+invite_coordinator = InviteCoordinator(fetch_invite_cache, attribute_joins, quick_attribute=quick_attribute_joins, window=INVITE_BATCH_WINDOW)
+
+def credit_invite(guild, cached_invite, member):
+    """Give the invite's creator +1 invite for a member who joined with it"""
+    inviter_id = cached_invite['inviter_id']
     
-    # Get entries
-    if guild_key not in entries_data or giveaway_id not in entries_data[guild_key] or not entries_data[guild_key][giveaway_id]:
-        # No entries, just mark as ended
-        giveaway_data[guild_key][giveaway_id]['active'] = False
-        giveaway_data[guild_key][giveaway_id]['ended_at'] = datetime.now().isoformat()
-        save_giveaway_data()
-        
-        embed = discord.Embed(
-            title="🚫 Giveaway Ended - No Entries",
-            description=f"The giveaway for **{giveaway_data[guild_key][giveaway_id]['prize']}** has ended with no entries.",
-            color=discord.Color.red()
-        )
-        embed.add_field(name="Giveaway ID", value=f"`{giveaway_id}`", inline=False)
-        await channel.send(embed=embed)
+    # Don't count bot invites or self-invites
+    if inviter_id is None or cached_invite['inviter_bot'] or inviter_id == member.id:
         return
     
-    # Create ticket pool
-    ticket_pool = []
-    guild = channel.guild
-    for user_id in entries_data[guild_key][giveaway_id]:
-        member = guild.get_member(int(user_id))
-        if member and not member.bot:
-            tickets = get_user_tickets(guild.id, int(user_id), giveaway_id)
-            ticket_pool.extend([int(user_id)] * tickets)
+    # Initialize inviter data if not exists
+    guild_invites = invite_data.setdefault(guild.id, {})
+    record = guild_invites.get(inviter_id)
+    if record is None:
+        record = guild_invites[inviter_id] = InviteRecord(0, 0)
     
-    if not ticket_pool:
-        # No valid entries
-        giveaway_data[guild_key][giveaway_id]['active'] = False
-        giveaway_data[guild_key][giveaway_id]['ended_at'] = datetime.now().isoformat()
-        save_giveaway_data()
-        
-        embed = discord.Embed(
-            title="🚫 Giveaway Ended - No Valid Entries",
-            description=f"The giveaway for **{giveaway_data[guild_key][giveaway_id]['prize']}** has ended with no valid entries.",
-            color=discord.Color.red()
-        )
-        embed.add_field(name="Giveaway ID", value=f"`{giveaway_id}`", inline=False)
-        await channel.send(embed=embed)
-        return
+    # Track who invited this member
+    inviter_tracking.guild(guild.id).set(member.id, inviter_id)
+    store.append('tracking', {'guild': str(guild.id), 'member': str(member.id), 'inviter': str(inviter_id)})
+    
+    # Increment invite count
+    record.invites += 1
+    tickets_changed(guild.id, inviter_id)
+    save_invite_data()
+
+def evaluate_giveaway(guild, giveaway_id):
+    """Ticket weights for every entrant of a giveaway who is still a (non-bot) member, in one pass"""
+    with metrics.timer('ticket_evaluation_seconds'):
+        return evaluate_entrants(guild, entry_index.entrants(guild.id, giveaway_id), ticket_cache.get)
+
+def mark_giveaway_ended(giveaway):
+    """Flag a giveaway as ended and stop routing its message's old-style buttons"""
+    giveaway.active = False
+    giveaway.ended_at = datetime.now().isoformat()
+    active_giveaways.pop(giveaway.message_id, None)
+
+def finish_giveaway(guild, giveaway_id, weights):
+    """Draw winners from ticket weights, mark the giveaway ended and build the winner announcement"""
+    giveaway = giveaway_data[guild.id][giveaway_id]
     
-    # Get number of winners
-    num_winners = giveaway_data[guild_key][giveaway_id].get('winners', 1)
-    num_winners = min(num_winners, len(set(ticket_pool)))  # Can't have more winners than unique participants
-    
-    # Pick winners (without replacement)
-    winner_ids = []
-    temp_pool = ticket_pool.copy()
-    for _ in range(num_winners):
-        if not temp_pool:
-            break
-        winner_id = random.choice(temp_pool)
-        winner_ids.append(winner_id)
-        # Remove all tickets from this winner to prevent duplicate wins
-        temp_pool = [uid for uid in temp_pool if uid != winner_id]
+    # Pick winners (weighted, without replacement)
+    with metrics.timer('draw_seconds'):
+        winner_ids, total_tickets = draw.draw_winners(weights.pairs(), giveaway.winners)
     
     # Mark as ended
-    prize = giveaway_data[guild_key][giveaway_id]['prize']
-    giveaway_data[guild_key][giveaway_id]['active'] = False
-    giveaway_data[guild_key][giveaway_id]['winners_list'] = [str(wid) for wid in winner_ids]
-    giveaway_data[guild_key][giveaway_id]['ended_at'] = datetime.now().isoformat()
-    giveaway_data[guild_key][giveaway_id]['total_entries'] = len(entries_data[guild_key][giveaway_id])
+    prize = giveaway.prize
+    mark_giveaway_ended(giveaway)
+    giveaway.winners_list = list(winner_ids)
+    giveaway.total_entries = entry_index.count(guild.id, giveaway_id)
     save_giveaway_data()
+    snapshot_cache.invalidate(guild.id, giveaway_id)
+    leaderboard_rankings.pop((guild.id, giveaway_id), None)  # No longer changes; rebuilt if someone opens it
     
     # Announce winners
     title = "🎊 GIVEAWAY WINNER! 🎊" if len(winner_ids) == 1 else f"🎊 GIVEAWAY WINNERS! 🎊"
     
     # Check if there's prize distribution
-    prize_dist = giveaway_data[guild_key][giveaway_id].get('prize_distribution')
+    prize_dist = giveaway.prize_distribution
     
     winners_text = ""
     for idx, winner_id in enumerate(winner_ids, 1):
         winner = guild.get_member(winner_id)
-        winner_tickets = get_user_tickets(guild.id, winner_id, giveaway_id)
+        tickets = get_user_tickets(guild.id, winner_id, giveaway_id)
         
         if prize_dist and len(prize_dist) >= idx:
             # Show specific prize for this position
             winner_prize = prize_dist[idx - 1]
-            winners_text += f"**{idx}.** {winner.mention} - **{winner_prize}** ({winner_tickets} tickets)\n"
+            winners_text += f"**{idx}.** {winner.mention} - **{winner_prize}** ({tickets} tickets)\n"
         elif len(winner_ids) == 1:
             winners_text = f"**{winner.mention}** has won **{prize}**!"
         else:
-            winners_text += f"**{idx}.** {winner.mention} ({winner_tickets} tickets)\n"
+            winners_text += f"**{idx}.** {winner.mention} ({tickets} tickets)\n"
     
     if len(winner_ids) > 1:
         if prize_dist:
@@ -207,157 +429,393 @@ async def auto_end_giveaway(guild_key, giveaway_id, delay_seconds, channel):
         description=description,
         color=discord.Color.green()
     )
-    embed.add_field(name="Total Participants", value=f"{len(entries_data[guild_key][giveaway_id])}", inline=True)
-    embed.add_field(name="Total Ticket Entries", value=f"{len(ticket_pool)}", inline=True)
+    embed.add_field(name="Total Participants", value=f"{giveaway.total_entries}", inline=True)
+    embed.add_field(name="Total Ticket Entries", value=f"{total_tickets}", inline=True)
     embed.add_field(name="Giveaway ID", value=f"`{giveaway_id}`", inline=True)
     
     if len(winner_ids) == 1:
         embed.set_thumbnail(url=guild.get_member(winner_ids[0]).display_avatar.url)
     
     embed.set_footer(text="Congratulations! 🎉")
+    return winner_ids, embed
+
+async def auto_end_giveaway(guild_id, giveaway_id, channel):
+    """Automatically end a giveaway once its end time is reached"""
+    # Check if giveaway is still active
+    giveaway = giveaway_data.get(guild_id, {}).get(giveaway_id)
+    if giveaway is None:
+        return
+    
+    if not giveaway.active:
+        return  # Already ended
+    
+    # Get entries
+    if not entry_index.has_entries(guild_id, giveaway_id):
+        # No entries, just mark as ended
+        mark_giveaway_ended(giveaway)
+        save_giveaway_data()
+        
+        embed = discord.Embed(
+            title="🚫 Giveaway Ended - No Entries",
+            description=f"The giveaway for **{giveaway.prize}** has ended with no entries.",
+            color=discord.Color.red()
+        )
+        embed.add_field(name="Giveaway ID", value=f"`{giveaway_id}`", inline=False)
+        await channel.send(embed=embed)
+        return
+    
+    # Collect ticket weights
+    weights = evaluate_giveaway(channel.guild, giveaway_id)
+    
+    if weights.total <= 0:
+        # No valid entries
+        mark_giveaway_ended(giveaway)
+        save_giveaway_data()
+        
+        embed = discord.Embed(
+            title="🚫 Giveaway Ended - No Valid Entries",
+            description=f"The giveaway for **{giveaway.prize}** has ended with no valid entries.",
+            color=discord.Color.red()
+        )
+        embed.add_field(name="Giveaway ID", value=f"`{giveaway_id}`", inline=False)
+        await channel.send(embed=embed)
+        return
     
+    _, embed = finish_giveaway(channel.guild, giveaway_id, weights)
     await channel.send(embed=embed)
 
+async def end_scheduled_giveaway(guild_id, giveaway_id):
+    """Scheduler callback: find the giveaway's channel and end it"""
+    await bot.wait_until_ready()
+    giveaway = giveaway_data.get(guild_id, {}).get(giveaway_id)
+    if not giveaway or not giveaway.active:
+        return
+    
+    channel_id = giveaway.channel_id
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        try:
+            channel = await bot.fetch_channel(channel_id)
+        except discord.HTTPException as e:
+            print(f'Cannot end giveaway {giveaway_id}: channel {channel_id} unavailable ({e})')
+            return
+    await auto_end_giveaway(guild_id, giveaway_id, channel)
+
+def schedule_active_giveaways():
+    """Rebuild the end timers and message routes for every active giveaway from stored data"""
+    active_giveaways.clear()
+    for guild_id, guild_giveaways in giveaway_data.items():
+        for giveaway_id, giveaway in guild_giveaways.items():
+            if giveaway.active and giveaway.message_id:
+                active_giveaways[giveaway.message_id] = giveaway_id
+            if giveaway.active and giveaway.end_time:
+                end_time = datetime.fromisoformat(giveaway.end_time)
+                giveaway_scheduler.schedule(guild_id, giveaway_id, end_time.timestamp())
+    print(f'{giveaway_scheduler.pending} giveaway(s) scheduled to end')
+
+# One loop ends every giveaway on time; overdue ones (e.g. after a restart) end right away
+giveaway_scheduler = GiveawayScheduler(end_scheduled_giveaway, max_concurrency=4)
+
+ARCHIVE_SWEEP_INTERVAL = 3600  # Seconds between checks for ended giveaways to archive
+
+def archive_record(guild, guild_id, giveaway_id, giveaway):
+    """A giveaway and its entrants' tickets as they stand now, in the archive format"""
+    entrants = entry_index.entrants(guild_id, giveaway_id)
+    if guild is not None:
+        # Not through the ticket cache, which shouldn't fill up with users of a finished giveaway
+        weights = evaluate_entrants(guild, entrants, compute_ticket_bonuses)
+        tickets_by_user = dict(weights.pairs())
+        tickets = [tickets_by_user.get(user_id, 0) for user_id in entrants]
+    else:
+        # The bot left the guild: membership can't be checked, keep everyone's bonus tickets
+        tickets = [1 + sum(compute_ticket_bonuses(guild_id, user_id)) for user_id in entrants]
+    return {
+        'giveaway': giveaway.to_json(),
+        'archived_at': datetime.now().isoformat(),
+        'entrants': [str(user_id) for user_id in entrants],
+        'tickets': tickets,
+    }
+
+async def archive_ended_giveaways():
+    """Move the entries of giveaways that ended over ARCHIVE_AFTER_DAYS ago to the archive"""
+    cutoff = datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    loop = asyncio.get_running_loop()
+    for guild_id in list(giveaway_data):
+        # Looked up under the lock: /cleargiveaway may have replaced the guild's giveaways while
+        # an earlier guild was being written, and its archive delete waits for this lock
+        async with giveaway_archive.guild_lock(guild_id):
+            guild_giveaways = giveaway_data.get(guild_id)
+            if guild_giveaways is None:
+                continue
+            due = {
+                giveaway_id: giveaway for giveaway_id, giveaway in guild_giveaways.items()
+                if not giveaway.active and not giveaway.archived_at and giveaway.ended_at and datetime.fromisoformat(giveaway.ended_at) <= cutoff
+            }
+            if not due:
+                continue
+            records = {giveaway_id: archive_record(bot.get_guild(guild_id), guild_id, giveaway_id, giveaway) for giveaway_id, giveaway in due.items()}
+            await loop.run_in_executor(None, giveaway_archive.write, guild_id, records)
+            if giveaway_data.get(guild_id) is not guild_giveaways:
+                continue  # /cleargiveaway ran during the write and deletes the archive once we let go of the lock
+            
+            # Only the giveaway record (prize, winners, totals) stays in the hot data
+            for giveaway_id, giveaway in due.items():
+                giveaway.archived_at = records[giveaway_id]['archived_at']
+                entry_index.drop_giveaway(guild_id, giveaway_id)
+                leaderboard_rankings.pop((guild_id, giveaway_id), None)
+                snapshot_cache.invalidate(guild_id, giveaway_id)
+        save_giveaway_data()
+        save_entries_data()
+        print(f'Archived {len(due)} ended giveaway(s) in guild {guild_id}')
+
+async def archive_loop():
+    await bot.wait_until_ready()  # Guild caches are needed to tell who was still eligible
+    while True:
+        try:
+            await archive_ended_giveaways()
+        except Exception as e:
+            print(f'Failed to archive ended giveaways: {e}')
+        await asyncio.sleep(ARCHIVE_SWEEP_INTERVAL)
+
+def compute_ticket_bonuses(guild_id, user_id):
+    """Work out (invite_bonus, manual_bonus, role_bonus) for a user from scratch"""
+    record = invite_data.get(guild_id, {}).get(user_id)
+    
+    # Bonus tickets from invites (capped at 5)
+    invite_count = min(record.invites, MAX_EXTRA_TICKETS) if record else 0
+    
+    # Manual bonus tickets (no cap)
+    manual_bonus = record.manual_bonus if record else 0
+    
+    # Bonus tickets for holding bonus roles
+    role_bonus = bonus_roles.role_bonus(guild_id, user_id)
+    
+    return invite_count, manual_bonus, role_bonus
+
+# Bonus roles resolved to IDs per guild, with holder sets kept current from member events
+bonus_roles = BonusRoleIndex(BONUS_ROLES)
+
+def refresh_bonus_roles(guild):
+    """Re-resolve a guild's bonus roles and drop its cached tickets"""
+    bonus_roles.resolve(guild)
+    guild_tickets_changed(guild.id)
+
+# Computed ticket bonuses per (guild, user), invalidated whenever an input changes
+ticket_cache = TicketCache(compute_ticket_bonuses)
+
+# Incrementally maintained rankings for the most recently opened leaderboards (LRU, RANKING_CACHE_SIZE)
+leaderboard_rankings = OrderedDict()  # {(guild_id, giveaway_id): TicketRanking}
+
+# Rendered leaderboard pages and status embeds, reused for a few seconds when many people ask at once
+snapshot_cache = SnapshotCache(ttl=SNAPSHOT_CACHE_TTL, max_entries=SNAPSHOT_CACHE_SIZE)
+
+# Ended giveaways past the retention window, read back only when someone opens their leaderboard
+giveaway_archive = GiveawayArchive(ARCHIVE_DIR, cache_size=ARCHIVE_CACHE_SIZE)
+
+def tickets_changed(guild_id, user_id):
+    """Drop a user's cached tickets and re-rank them on every leaderboard they're on"""
+    ticket_cache.invalidate(guild_id, user_id)
+    for giveaway_id in entry_index.user_giveaways(guild_id, user_id):
+        ranking = leaderboard_rankings.get((guild_id, giveaway_id))
+        if ranking is not None:
+            ranking.mark_dirty(user_id)
+        snapshot_cache.invalidate(guild_id, giveaway_id)
+
+def guild_tickets_changed(guild_id):
+    """Drop every cached ticket count, ranking and snapshot for a guild"""
+    ticket_cache.invalidate_guild(guild_id)
+    snapshot_cache.invalidate_guild(guild_id)
+    for key in [key for key in leaderboard_rankings if key[0] == guild_id]:
+        del leaderboard_rankings[key]
+
+def get_ranking(guild, giveaway_id):
+    """The giveaway's leaderboard ranking, built with one batch pass the first time"""
+    key = (guild.id, giveaway_id)
+    ranking = leaderboard_rankings.get(key)
+    if ranking is not None:
+        leaderboard_rankings.move_to_end(key)
+    else:
+        def tickets_for(user_id):
+            member = guild.get_member(user_id)
+            if member is None or member.bot or not entry_index.contains(guild.id, giveaway_id, user_id):
+                return None
+            invite_bonus, manual_bonus, role_bonus = ticket_cache.get(guild.id, user_id)
+            return 1 + invite_bonus + manual_bonus + role_bonus
+        ranking = TicketRanking(evaluate_giveaway(guild, giveaway_id), tickets_for)
+        leaderboard_rankings[key] = ranking
+        while len(leaderboard_rankings) > RANKING_CACHE_SIZE:
+            leaderboard_rankings.popitem(last=False)
+    return ranking
+
 def get_user_tickets(guild_id, user_id, giveaway_id=None):
     """Calculate total tickets for a user (1 base + invite bonus + role bonus)"""
-    guild_key = str(guild_id)
-    user_key = str(user_id)
-    
     # If giveaway_id is provided, check if user entered that specific giveaway
     if giveaway_id:
-        if (guild_key not in entries_data or 
-            giveaway_id not in entries_data[guild_key] or 
-            user_key not in entries_data[guild_key][giveaway_id]):
+        if not entry_index.contains(guild_id, giveaway_id, user_id):
             return 0  # No tickets if not entered this giveaway
     else:
         # Check if user has entered ANY giveaway
-        user_entered = False
-        if guild_key in entries_data:
-            for gid in entries_data[guild_key]:
-                if user_key in entries_data[guild_key][gid]:
-                    user_entered = True
-                    break
-        if not user_entered:
+        if not entry_index.has_entered_any(guild_id, user_id):
             return 0  # No tickets if not entered any giveaway
     
-    # Base ticket (only if entered)
-    base_tickets = 1
-    
-    # Bonus tickets from invites (capped at 5)
-    invite_count = 0
-    if guild_key in invite_data and user_key in invite_data[guild_key]:
-        invite_count = min(invite_data[guild_key][user_key].get('invites', 0), MAX_EXTRA_TICKETS)
-    
-    # Manual bonus tickets (no cap)
-    manual_bonus = 0
-    if guild_key in invite_data and user_key in invite_data[guild_key]:
-        manual_bonus = invite_data[guild_key][user_key].get('manual_bonus', 0)
-    
-    # Bonus ticket for having the special role
-    role_bonus = 0
+    # Base ticket (only if entered) + cached bonuses
+    invite_count, manual_bonus, role_bonus = ticket_cache.get(guild_id, user_id)
+    return 1 + invite_count + role_bonus + manual_bonus
+
+def log_startup_phase(phase, started):
+    print(f'Startup: {phase} took {time.perf_counter() - started:.2f}s')
+
+def command_tree_hash(tree):
+    """Hash of the slash command definitions, to tell whether a sync is needed"""
+    payload = [command.to_dict(tree) for command in tree.get_commands()]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_commands_if_changed(tree):
+    """Sync slash commands only when their definitions changed since the last successful sync"""
+    tree_hash = command_tree_hash(tree)
     try:
-        guild = bot.get_guild(int(guild_id))
-        if guild:
-            member = guild.get_member(int(user_id))
-            if member:
-                bonus_role = discord.utils.get(member.roles, name=BONUS_ROLE_NAME)
-                if bonus_role:
-                    role_bonus = BONUS_ROLE_TICKETS
-    except:
+        with open(COMMAND_HASH_FILE) as f:
+            if f.read().strip() == tree_hash:
+                print('Slash commands unchanged, skipping sync')
+                return
+    except OSError:
         pass
     
-    return base_tickets + invite_count + role_bonus + manual_bonus
-
-@bot.event
-async def on_ready():
-    """Bot startup event"""
-    print(f'{bot.user} has connected to Discord!')
-    load_data()
-    
-    # Cache all invites for all guilds
-    for guild in bot.guilds:
-        invites[guild.id] = await get_invites(guild)
-        print(f'Loaded {len(invites[guild.id])} invites for {guild.name}')
-    
-    # Sync slash commands
     try:
-        synced = await bot.tree.sync()
+        synced = await tree.sync()
         print(f'Synced {len(synced)} slash command(s)')
     except Exception as e:
         print(f'Failed to sync commands: {e}')
-    
+        return
+    with open(COMMAND_HASH_FILE, 'w') as f:  # A torn write just means one extra sync next time
+        f.write(tree_hash)
+
+async def warm_up_guild(guild, semaphore):
+    """Resolve bonus roles and cache invites for one guild"""
+    refresh_bonus_roles(guild)
+    async with semaphore:
+        invites[guild.id] = await invite_coordinator.fetch(guild)
+    print(f'Loaded {len(invites[guild.id])} invites for {guild.name}')
+
+async def warm_up_guild_list(guilds):
+    """Warm up several guilds, a few at a time"""
+    # discord.py waits out 429s itself; the semaphore keeps a big bot from queueing hundreds at once
+    semaphore = asyncio.Semaphore(INVITE_WARMUP_CONCURRENCY)
+    results = await asyncio.gather(*(warm_up_guild(guild, semaphore) for guild in guilds), return_exceptions=True)
+    for guild, result in zip(guilds, results):
+        if isinstance(result, Exception):
+            print(f'Failed to warm up {guild.name}: {result}')
+
+async def warm_up_guilds(client, started):
+    """Cache invites for every guild once the gateway is ready"""
+    await client.wait_until_ready()
+    phase = time.perf_counter()
+    await warm_up_guild_list(client.guilds)
+    log_startup_phase(f'invite warm-up ({len(client.guilds)} guilds)', phase)
+    log_startup_phase('total', started)
     print('Bot is ready!')
     print(f'Giveaway system active - Max extra tickets from invites: {MAX_EXTRA_TICKETS}')
 
+gateway_sessions = 0  # READY events seen; the first one is handled by warm_up_guilds
+
+@bot.event
+async def on_ready():
+    """Fires on startup and after every new gateway session; state is set up once in setup_hook"""
+    global gateway_sessions
+    gateway_sessions += 1
+    print(f'{bot.user} has connected to Discord!')
+    # Joins during the outage weren't seen, so the cached invite uses are stale. A sharded
+    # bot refreshes per shard in on_shard_ready instead.
+    if gateway_sessions > 1 and not SHARD_COUNT:
+        print('New gateway session, refreshing invite caches')
+        await warm_up_guild_list(bot.guilds)
+
+@bot.event
+async def on_shard_ready(shard_id):
+    """A shard started a new session; after startup, refresh the invite caches of its guilds"""
+    if gateway_sessions:
+        guilds = [guild for guild in bot.guilds if guild.shard_id == shard_id]
+        print(f'Shard {shard_id} started a new session, refreshing invite caches for {len(guilds)} guild(s)')
+        await warm_up_guild_list(guilds)
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    """Record slash command latency (errors are recorded by GiveawayCommandTree.on_error)"""
+    started_at = interaction.extras.get('started_at')
+    if started_at is not None:
+        metrics.observe('command_seconds', time.perf_counter() - started_at, command=command.qualified_name)
+
+@bot.event
+async def on_guild_join(guild):
+    """Warm up servers the bot is added to after startup"""
+    await warm_up_guild(guild, asyncio.Semaphore(1))
+
+@bot.event
+async def on_invite_create(invite):
+    """Keep the invite cache current without refetching"""
+    if invite.guild is not None:
+        invites.setdefault(invite.guild.id, {})[invite.code] = cache_invite(invite)
+
+@bot.event
+async def on_invite_delete(invite):
+    """Drop deleted invites, remembering them briefly in case a join used them up"""
+    if invite.guild is None:
+        return
+    cached = invites.get(invite.guild.id, {}).pop(invite.code, None)
+    if cached is not None:
+        recently_deleted_invites.setdefault(invite.guild.id, {})[invite.code] = (datetime.now().timestamp(), cached)
+
 @bot.event
 async def on_member_join(member):
     """Track when a member joins via invite"""
-    guild = member.guild
-    
-    # Get current invites
-    new_invites = await get_invites(guild)
-    
-    # Compare with cached invites to find which was used
-    if guild.id in invites:
-        old_invites = invites[guild.id]
-        
-        # Find the invite that was used
-        for new_invite in new_invites:
-            for old_invite in old_invites:
-                if new_invite.code == old_invite.code and new_invite.uses > old_invite.uses:
-                    inviter = new_invite.inviter
-                    
-                    # Don't count bot invites or self-invites
-                    if inviter.bot or inviter.id == member.id:
-                        break
-                    
-                    # Initialize inviter data if not exists
-                    guild_key = str(guild.id)
-                    user_key = str(inviter.id)
-                    member_key = str(member.id)
-                    
-                    if guild_key not in invite_data:
-                        invite_data[guild_key] = {}
-                    
-                    if user_key not in invite_data[guild_key]:
-                        invite_data[guild_key][user_key] = {'invites': 0}
-                    
-                    # Track who invited this member
-                    if guild_key not in inviter_tracking:
-                        inviter_tracking[guild_key] = {}
-                    inviter_tracking[guild_key][member_key] = user_key
-                    
-                    # Increment invite count
-                    invite_data[guild_key][user_key]['invites'] += 1
-                    save_invite_data()
-                    
-                    break
+    # A returning member's role bonus was cached as a non-member
+    bonus_roles.member_updated(member)
+    tickets_changed(member.guild.id, member.id)
     
-    # Update cached invites
-    invites[guild.id] = new_invites
+    # Joins are attributed in per-guild batches so a burst shares one invite fetch
+    invite_coordinator.member_joined(member.guild, member)
 
 @bot.event
 async def on_member_remove(member):
     """Track when a member leaves and deduct invite from their inviter"""
     guild = member.guild
-    guild_key = str(guild.id)
-    member_key = str(member.id)
+    bonus_roles.member_removed(guild.id, member.id)
+    tickets_changed(guild.id, member.id)  # No role bonus (or leaderboard spot) once they're gone
     
-    # Check if we know who invited this member
-    if guild_key in inviter_tracking and member_key in inviter_tracking[guild_key]:
-        inviter_key = inviter_tracking[guild_key][member_key]
+    # Check if we know who invited this member (and remove tracking)
+    inviter_id = inviter_tracking.guild(guild.id).pop(member.id) if guild.id in inviter_tracking else None
+    if inviter_id is not None:
+        store.append('tracking', {'guild': str(guild.id), 'member': str(member.id), 'inviter': None})
         
         # Deduct invite from the inviter
-        if guild_key in invite_data and inviter_key in invite_data[guild_key]:
-            if invite_data[guild_key][inviter_key]['invites'] > 0:
-                invite_data[guild_key][inviter_key]['invites'] -= 1
-                save_invite_data()
-        
-        # Remove tracking
-        del inviter_tracking[guild_key][member_key]
-    
-    # Update cached invites
-    invites[guild.id] = await get_invites(guild)
+        record = invite_data.get(guild.id, {}).get(inviter_id)
+        if record is not None and record.invites > 0:
+            record.invites -= 1
+            tickets_changed(guild.id, inviter_id)
+            save_invite_data()
+
+@bot.event
+async def on_member_update(before, after):
+    """Role changes can add or remove the bonus role ticket"""
+    if before.roles != after.roles and bonus_roles.member_updated(after):
+        tickets_changed(after.guild.id, after.id)
+
+@bot.event
+async def on_guild_role_create(role):
+    """A new role may carry a bonus role name"""
+    if bonus_roles.is_bonus_role(role):
+        refresh_bonus_roles(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    """Renaming a role can make it (or stop it being) a bonus role"""
+    if bonus_roles.is_bonus_role(before) or bonus_roles.is_bonus_role(after):
+        refresh_bonus_roles(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    if bonus_roles.is_bonus_role(role):
+        refresh_bonus_roles(role.guild)
 
 @bot.tree.command(name='tickets', description='Check how many giveaway tickets you or another user has')
 async def check_tickets(interaction: discord.Interaction, member: discord.Member = None):
@@ -365,19 +823,17 @@ async def check_tickets(interaction: discord.Interaction, member: discord.Member
     if member is None:
         member = interaction.user
     
-    guild_key = str(interaction.guild.id)
-    user_key = str(member.id)
-    
     # Get invite count
     invite_count = 0
     manual_bonus = 0
-    if guild_key in invite_data and user_key in invite_data[guild_key]:
-        invite_count = invite_data[guild_key][user_key].get('invites', 0)
-        manual_bonus = invite_data[guild_key][user_key].get('manual_bonus', 0)
+    record = invite_data.get(interaction.guild.id, {}).get(member.id)
+    if record is not None:
+        invite_count = record.invites
+        manual_bonus = record.manual_bonus
     
-    # Check for bonus role
-    has_bonus_role = discord.utils.get(member.roles, name=BONUS_ROLE_NAME) is not None
-    role_bonus = BONUS_ROLE_TICKETS if has_bonus_role else 0
+    # Check for bonus roles
+    role_bonus = bonus_roles.role_bonus(interaction.guild.id, member.id)
+    has_bonus_role = role_bonus > 0
     
     # Calculate tickets
     total_tickets = get_user_tickets(interaction.guild.id, member.id)
@@ -389,7 +845,7 @@ async def check_tickets(interaction: discord.Interaction, member: discord.Member
     )
     embed.add_field(name="Total Tickets", value=f"**{total_tickets}**", inline=False)
     embed.add_field(name="Base Ticket", value="1", inline=True)
-    embed.add_field(name=f"{BONUS_ROLE_NAME} Server Tag", value=f"{'✅' if has_bonus_role else '❌'} (+{role_bonus})", inline=True)
+    embed.add_field(name=BONUS_ROLE_LABEL, value=f"{'✅' if has_bonus_role else '❌'} (+{role_bonus})", inline=True)
     embed.add_field(name="Invite Tickets", value=f"{extra_tickets}/{MAX_EXTRA_TICKETS}", inline=True)
     if manual_bonus != 0:
         embed.add_field(name="Manual Bonus", value=f"+{manual_bonus}", inline=True)
@@ -401,113 +857,142 @@ async def check_tickets(interaction: discord.Interaction, member: discord.Member
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 # Button View for entering giveaway
-class GiveawayView(discord.ui.View):
-    def __init__(self, giveaway_id: str):
-        super().__init__(timeout=None)  # No timeout
-        self.giveaway_id = giveaway_id
+async def send_entry_reply(job):
+    """Follow up on an acknowledged enter-button click with the user's ticket count"""
+    interaction, guild_id, giveaway_id, is_new = job
+    tickets = get_user_tickets(interaction.guild.id, interaction.user.id, giveaway_id)
+    if not is_new:
+        await interaction.followup.send(f'✅ You are already entered with **{tickets} tickets**!', ephemeral=True)
+        return
     
-    @discord.ui.button(label="🎫 Enter Giveaway", style=discord.ButtonStyle.green, custom_id="enter_giveaway")
-    async def enter_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        guild_key = str(interaction.guild.id)
-        user_key = str(interaction.user.id)
-        giveaway_id = self.giveaway_id
-        
-        # Check if giveaway exists and is active
-        if guild_key not in giveaway_data or giveaway_id not in giveaway_data[guild_key]:
-            await interaction.response.send_message('❌ This giveaway no longer exists!', ephemeral=True)
-            return
-        
-        if not giveaway_data[guild_key][giveaway_id].get('active'):
-            await interaction.response.send_message('❌ This giveaway has ended!', ephemeral=True)
-            return
-        
-        # Initialize entries for this giveaway
-        if guild_key not in entries_data:
-            entries_data[guild_key] = {}
-        if giveaway_id not in entries_data[guild_key]:
-            entries_data[guild_key][giveaway_id] = []
-        
-        # Check if user already entered
-        if user_key in entries_data[guild_key][giveaway_id]:
-            tickets = get_user_tickets(interaction.guild.id, interaction.user.id, giveaway_id)
-            await interaction.response.send_message(
-                f'✅ You are already entered with **{tickets} tickets**!',
-                ephemeral=True
-            )
-            return
-        
-        # Add user to entries
-        entries_data[guild_key][giveaway_id].append(user_key)
-        save_entries_data()
-        
-        # Get user's ticket count
-        tickets = get_user_tickets(interaction.guild.id, interaction.user.id, giveaway_id)
+    prize = giveaway_data[guild_id][giveaway_id].prize
+    await interaction.followup.send(
+        f'🎉 You have entered the giveaway for **{prize}** with **{tickets} tickets**!\n'
+        f'Invite friends to get more tickets (max 5 extra)!',
+        ephemeral=True
+    )
+
+# Enter-button follow-ups, sent by a few workers so a click spike can't flood the event loop
+entry_queue = EntryQueue(send_entry_reply, workers=ENTRY_REPLY_WORKERS, max_depth=ENTRY_QUEUE_LIMIT)
+
+@metrics.timed('button_seconds', button='enter_giveaway')
+async def enter_giveaway(interaction: discord.Interaction, giveaway_id):
+    """Enter button: record the entry and queue the reply with the user's tickets"""
+    guild_id = interaction.guild.id
+    
+    # Check if giveaway exists and is active
+    giveaway = giveaway_data.get(guild_id, {}).get(giveaway_id)
+    if giveaway is None:
+        await interaction.response.send_message('❌ This giveaway no longer exists!', ephemeral=True)
+        return
+    
+    if not giveaway.active:
+        await interaction.response.send_message('❌ This giveaway has ended!', ephemeral=True)
+        return
+    
+    # Turn clicks away while the reply queue is full rather than fall behind on everything
+    if not entry_queue.admit():
+        await interaction.response.send_message('⏳ Lots of people are entering right now, please click again in a few seconds!', ephemeral=True)
+        return
+    
+    # Acknowledge within Discord's deadline, then record the entry (in memory, saved in the background)
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    is_new = record_entry(guild_id, giveaway_id, interaction.user.id)
+    entry_queue.submit((interaction, guild_id, giveaway_id, is_new))
+
+@metrics.timed('button_seconds', button='get_invite')
+async def show_invite_help(interaction: discord.Interaction, giveaway_id):
+    """How to Invite button: the user's invite stats and how to make an invite link"""
+    # Get current ticket count
+    guild_id = interaction.guild.id
+    user_id = interaction.user.id
+    
+    # Get user stats
+    tickets = get_user_tickets(guild_id, user_id, giveaway_id)
+    record = invite_data.get(guild_id, {}).get(user_id)
+    current_invites = record.invites if record else 0
+    
+    extra_available = MAX_EXTRA_TICKETS - current_invites
+    
+    # Check if user has entered this specific giveaway
+    user_entered = entry_index.contains(guild_id, giveaway_id, user_id)
+    
+    if user_entered:
+        embed = discord.Embed(
+            title="🔗 How to Earn Extra Tickets",
+            description="Invite friends to earn up to 5 extra tickets!",
+            color=discord.Color.blue()
+        )
+        embed.add_field(
+            name="📊 Your Current Stats",
+            value=(
+                f"🎫 **Total Tickets:** {tickets}\n"
+                f"👥 **Invites:** {current_invites}/{MAX_EXTRA_TICKETS}\n"
+                f"⬆️ **Extra Tickets Available:** {extra_available}"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="🛠️ How to Create Your Invite Link",
+            value=(
+                "1. Click/Tap the **server name** at the top\n"
+                "2. Click/Tap **'Invite'**\n"
+                "3. Copy and share your invite link!"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="✨ Important",
+            value="Make sure to create your **own** invite link! The bot tracks who created each invite.",
+            inline=False
+        )
+        embed.set_footer(text="Each friend who joins = +1 ticket (max 5 extra)")
         
-        prize = giveaway_data[guild_key][giveaway_id]['prize']
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    else:
         await interaction.response.send_message(
-            f'🎉 You have entered the giveaway for **{prize}** with **{tickets} tickets**!\n'
-            f'Invite friends to get more tickets (max 5 extra)!',
+            "⚠️ **You haven't entered the giveaway yet!**\n\n"
+            "Click the **'Enter Giveaway'** button first, then you can invite friends to earn extra tickets!",
             ephemeral=True
         )
+
+class GiveawayButton(discord.ui.DynamicItem[discord.ui.Button], template=r'giveaway:(?P<action>enter|invite):(?P<giveaway_id>[\w-]+)|(?P<legacy>enter_giveaway|get_invite)'):
+    """The buttons of every giveaway message, routed by custom ID and registered once in setup_hook
     
-    @discord.ui.button(label="🔗 How to Invite", style=discord.ButtonStyle.blurple, custom_id="get_invite")
-    async def invite_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        # Get current ticket count
-        guild_key = str(interaction.guild.id)
-        user_key = str(interaction.user.id)
-        giveaway_id = self.giveaway_id
-        
-        # Get user stats
-        tickets = get_user_tickets(interaction.guild.id, interaction.user.id, giveaway_id)
-        current_invites = 0
-        if guild_key in invite_data and user_key in invite_data[guild_key]:
-            current_invites = invite_data[guild_key][user_key]['invites']
-        
-        extra_available = MAX_EXTRA_TICKETS - current_invites
-        
-        # Check if user has entered this specific giveaway
-        user_entered = (guild_key in entries_data and 
-                       giveaway_id in entries_data[guild_key] and 
-                       user_key in entries_data[guild_key][giveaway_id])
-        
-        if user_entered:
-            embed = discord.Embed(
-                title="🔗 How to Earn Extra Tickets",
-                description="Invite friends to earn up to 5 extra tickets!",
-                color=discord.Color.blue()
-            )
-            embed.add_field(
-                name="📊 Your Current Stats",
-                value=(
-                    f"🎫 **Total Tickets:** {tickets}\n"
-                    f"👥 **Invites:** {current_invites}/{MAX_EXTRA_TICKETS}\n"
-                    f"⬆️ **Extra Tickets Available:** {extra_available}"
-                ),
-                inline=False
-            )
-            embed.add_field(
-                name="🛠️ How to Create Your Invite Link",
-                value=(
-                    "1. Click/Tap the **server name** at the top\n"
-                    "2. Click/Tap **'Invite'**\n"
-                    "3. Copy and share your invite link!"
-                ),
-                inline=False
-            )
-            embed.add_field(
-                name="✨ Important",
-                value="Make sure to create your **own** invite link! The bot tracks who created each invite.",
-                inline=False
-            )
-            embed.set_footer(text="Each friend who joins = +1 ticket (max 5 extra)")
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+    New messages carry the giveaway in the ID (giveaway:enter:<giveaway_id>). Messages
+    posted before that use the shared enter_giveaway / get_invite IDs and are resolved
+    through active_giveaways by message ID.
+    """
+    
+    LEGACY_ACTIONS = {'enter_giveaway': 'enter', 'get_invite': 'invite'}
+    
+    def __init__(self, action, giveaway_id):
+        if action == 'enter':
+            button = discord.ui.Button(label="🎫 Enter Giveaway", style=discord.ButtonStyle.green, custom_id=f'giveaway:enter:{giveaway_id}')
         else:
-            await interaction.response.send_message(
-                "⚠️ **You haven't entered the giveaway yet!**\n\n"
-                "Click the **'Enter Giveaway'** button first, then you can invite friends to earn extra tickets!",
-                ephemeral=True
-            )
+            button = discord.ui.Button(label="🔗 How to Invite", style=discord.ButtonStyle.blurple, custom_id=f'giveaway:invite:{giveaway_id}')
+        super().__init__(button)
+        self.action = action
+        self.giveaway_id = giveaway_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        if match['legacy']:
+            giveaway_id = active_giveaways.get(interaction.message.id) if interaction.message else None
+            return cls(cls.LEGACY_ACTIONS[match['legacy']], giveaway_id)
+        return cls(match['action'], match['giveaway_id'])
+    
+    async def callback(self, interaction: discord.Interaction):
+        await BUTTON_HANDLERS[self.action](interaction, self.giveaway_id)
+
+BUTTON_HANDLERS = {'enter': enter_giveaway, 'invite': show_invite_help}
+
+def giveaway_view(giveaway_id):
+    """Buttons for a new giveaway message; nothing is kept per message, GiveawayButton routes the clicks"""
+    view = discord.ui.View(timeout=None)
+    view.add_item(GiveawayButton('enter', giveaway_id))
+    view.add_item(GiveawayButton('invite', giveaway_id))
+    return view
 
 @bot.tree.command(name='giveaway', description='Create a new giveaway (Admin only)')
 @discord.app_commands.describe(
@@ -540,14 +1025,12 @@ async def create_giveaway(interaction: discord.Interaction, prize: str, duration
         await interaction.response.send_message('❌ Cannot have more than 10 winners!', ephemeral=True)
         return
     
-    guild_key = str(interaction.guild.id)
+    guild_id = interaction.guild.id
     giveaway_id = str(uuid.uuid4())[:8]  # Short unique ID
     
     # Initialize guild data if needed
-    if guild_key not in giveaway_data:
-        giveaway_data[guild_key] = {}
-    if guild_key not in entries_data:
-        entries_data[guild_key] = {}
+    if guild_id not in giveaway_data:
+        giveaway_data[guild_id] = {}
     
     # Calculate end time
     start_time = datetime.now()
@@ -565,26 +1048,22 @@ async def create_giveaway(interaction: discord.Interaction, prize: str, duration
             return
     
     # Create new giveaway
-    giveaway_data[guild_key][giveaway_id] = {
-        'active': True,
-        'prize': prize,
-        'created_at': start_time.isoformat(),
-        'created_by': str(interaction.user.id),
-        'channel_id': str(target_channel.id),
-        'duration_hours': duration_hours,
-        'end_time': end_time.isoformat(),
-        'winners': winners,
-        'prize_distribution': prizes_list if prizes_list else None
-    }
+    giveaway = giveaway_data[guild_id][giveaway_id] = Giveaway.create(
+        prize=prize,
+        created_at=start_time.isoformat(),
+        created_by=interaction.user.id,
+        channel_id=target_channel.id,
+        duration_hours=duration_hours,
+        end_time=end_time.isoformat(),
+        winners=winners,
+        prize_distribution=prizes_list if prizes_list else None
+    )
     save_giveaway_data()
     
     # Initialize entries for this giveaway
-    if guild_key not in entries_data:
-        entries_data[guild_key] = {}
-    # Safety check: ensure it's a dict, not a list
-    if not isinstance(entries_data[guild_key], dict):
-        entries_data[guild_key] = {}
-    entries_data[guild_key][giveaway_id] = []
+    entry_index.reset_giveaway(guild_id, giveaway_id)
+    leaderboard_rankings.pop((guild_id, giveaway_id), None)
+    snapshot_cache.invalidate(guild_id, giveaway_id)
     save_entries_data()
     
     # Format end time for Discord timestamp
@@ -619,9 +1098,9 @@ async def create_giveaway(interaction: discord.Interaction, prize: str, duration
         name="🎫 Get More Tickets",
         value=(
             "Everyone gets **1 base ticket**!\n"
-            f"✨ **{BONUS_ROLE_NAME}** server tag: **+{BONUS_ROLE_TICKETS} bonus ticket**\n"
+            + "".join(f"✨ **{name}** server tag: **+{tickets} bonus ticket**\n" for name, tickets in BONUS_ROLES.items()) +
             f"👥 Invite friends: **+1 ticket per invite** (max {MAX_EXTRA_TICKETS})\n"
-            f"**Max total: {1 + MAX_EXTRA_TICKETS + BONUS_ROLE_TICKETS} tickets**"
+            f"**Max total: {1 + MAX_EXTRA_TICKETS + MAX_ROLE_TICKETS} tickets**"
         ),
         inline=False
     )
@@ -638,7 +1117,7 @@ async def create_giveaway(interaction: discord.Interaction, prize: str, duration
     embed.set_footer(text="Good luck! 🍀")
     
     # Create view with button
-    view = GiveawayView(giveaway_id)
+    view = giveaway_view(giveaway_id)
     
     # Send confirmation to the user
     await interaction.response.send_message(
@@ -650,11 +1129,12 @@ async def create_giveaway(interaction: discord.Interaction, prize: str, duration
     message = await target_channel.send(content="@everyone", embed=embed, view=view)
     
     # Store message ID for reference
-    giveaway_data[guild_key][giveaway_id]['message_id'] = str(message.id)
+    giveaway.message_id = message.id
+    active_giveaways[message.id] = giveaway_id
     save_giveaway_data()
     
     # Schedule automatic ending
-    asyncio.create_task(auto_end_giveaway(guild_key, giveaway_id, duration_hours * 3600, target_channel))
+    giveaway_scheduler.schedule(guild_id, giveaway_id, end_time.timestamp())
 
 @bot.tree.command(name='endgiveaway', description='End a giveaway and pick a winner (Admin only)')
 @discord.app_commands.describe(
@@ -667,99 +1147,32 @@ async def end_giveaway(interaction: discord.Interaction, giveaway_id: str, chann
     # Use specified channel or current channel
     target_channel = channel if channel else interaction.channel
     
-    guild_key = str(interaction.guild.id)
+    guild_id = interaction.guild.id
     
     # Check if giveaway exists
-    if guild_key not in giveaway_data or giveaway_id not in giveaway_data[guild_key]:
+    giveaway = giveaway_data.get(guild_id, {}).get(giveaway_id)
+    if giveaway is None:
         await interaction.response.send_message(f'❌ Giveaway `{giveaway_id}` not found!', ephemeral=True)
         return
     
-    if not giveaway_data[guild_key][giveaway_id].get('active'):
+    if not giveaway.active:
         await interaction.response.send_message(f'❌ Giveaway `{giveaway_id}` has already ended!', ephemeral=True)
         return
     
     # Get all entries for this giveaway
-    if guild_key not in entries_data or giveaway_id not in entries_data[guild_key] or not entries_data[guild_key][giveaway_id]:
+    if not entry_index.has_entries(guild_id, giveaway_id):
         await interaction.response.send_message(f'❌ No one has entered giveaway `{giveaway_id}` yet!', ephemeral=True)
         return
     
-    # Create ticket pool from entries only
-    ticket_pool = []
-    for user_id in entries_data[guild_key][giveaway_id]:
-        member = interaction.guild.get_member(int(user_id))
-        if member and not member.bot:
-            tickets = get_user_tickets(interaction.guild.id, int(user_id), giveaway_id)
-            # Add member to pool based on their ticket count
-            ticket_pool.extend([int(user_id)] * tickets)
+    # Collect ticket weights from entries only
+    weights = evaluate_giveaway(interaction.guild, giveaway_id)
     
-    if not ticket_pool:
+    if weights.total <= 0:
         await interaction.response.send_message('❌ No valid entries found!', ephemeral=True)
         return
     
-    # Get number of winners
-    num_winners = giveaway_data[guild_key][giveaway_id].get('winners', 1)
-    num_winners = min(num_winners, len(set(ticket_pool)))  # Can't have more winners than unique participants
-    
-    # Pick winners (without replacement)
-    winner_ids = []
-    temp_pool = ticket_pool.copy()
-    for _ in range(num_winners):
-        if not temp_pool:
-            break
-        winner_id = random.choice(temp_pool)
-        winner_ids.append(winner_id)
-        # Remove all tickets from this winner to prevent duplicate wins
-        temp_pool = [uid for uid in temp_pool if uid != winner_id]
-    
-    # Mark giveaway as ended
-    prize = giveaway_data[guild_key][giveaway_id]['prize']
-    giveaway_data[guild_key][giveaway_id]['active'] = False
-    giveaway_data[guild_key][giveaway_id]['winners_list'] = [str(wid) for wid in winner_ids]
-    giveaway_data[guild_key][giveaway_id]['ended_at'] = datetime.now().isoformat()
-    giveaway_data[guild_key][giveaway_id]['total_entries'] = len(entries_data[guild_key][giveaway_id])
-    save_giveaway_data()
-    
-    # Announce winners
-    title = "🎊 GIVEAWAY WINNER! 🎊" if len(winner_ids) == 1 else f"🎊 GIVEAWAY WINNERS! 🎊"
-    
-    # Check if there's prize distribution
-    prize_dist = giveaway_data[guild_key][giveaway_id].get('prize_distribution')
-    
-    winners_text = ""
-    for idx, winner_id in enumerate(winner_ids, 1):
-        winner = interaction.guild.get_member(winner_id)
-        winner_tickets = get_user_tickets(interaction.guild.id, winner_id, giveaway_id)
-        
-        if prize_dist and len(prize_dist) >= idx:
-            # Show specific prize for this position
-            winner_prize = prize_dist[idx - 1]
-            winners_text += f"**{idx}.** {winner.mention} - **{winner_prize}** ({winner_tickets} tickets)\n"
-        elif len(winner_ids) == 1:
-            winners_text = f"**{winner.mention}** has won **{prize}**!"
-        else:
-            winners_text += f"**{idx}.** {winner.mention} ({winner_tickets} tickets)\n"
-    
-    if len(winner_ids) > 1:
-        if prize_dist:
-            description = f"**Winners:**\n{winners_text}"
-        else:
-            description = f"**Prize:** {prize}\n\n**Winners:**\n{winners_text}"
-    else:
-        description = winners_text
-    
-    embed = discord.Embed(
-        title=title,
-        description=description,
-        color=discord.Color.green()
-    )
-    embed.add_field(name="Total Participants", value=f"{len(entries_data[guild_key][giveaway_id])}", inline=True)
-    embed.add_field(name="Total Ticket Entries", value=f"{len(ticket_pool)}", inline=True)
-    embed.add_field(name="Giveaway ID", value=f"`{giveaway_id}`", inline=True)
-    
-    if len(winner_ids) == 1:
-        embed.set_thumbnail(url=interaction.guild.get_member(winner_ids[0]).display_avatar.url)
-    
-    embed.set_footer(text="Congratulations! 🎉")
+    winner_ids, embed = finish_giveaway(interaction.guild, giveaway_id, weights)
+    giveaway_scheduler.cancel(guild_id, giveaway_id)
     
     # Send confirmation to admin
     winners_count_text = "Winner" if len(winner_ids) == 1 else f"{len(winner_ids)} winners"
@@ -772,60 +1185,84 @@ async def end_giveaway(interaction: discord.Interaction, giveaway_id: str, chann
     await target_channel.send(embed=embed)
 
 class LeaderboardView(discord.ui.View):
-    def __init__(self, member_tickets, prize, giveaway_id, is_active, total_tickets, page=0):
+    def __init__(self, guild, prize, giveaway_id, is_active, page=0, archived_ranking=None):
         super().__init__(timeout=180)
-        self.member_tickets = member_tickets
+        # Only IDs are kept; rows and names are looked up for the page being shown
+        self.guild_id = guild.id
         self.prize = prize
         self.giveaway_id = giveaway_id
         self.is_active = is_active
-        self.total_tickets = total_tickets
+        self.archived_ranking = archived_ranking  # Frozen ranking of an archived giveaway
         self.page = page
         self.per_page = 10
-        self.max_pages = (len(member_tickets) - 1) // self.per_page
-        
-        # Update button states
-        self.update_buttons()
+        self.max_pages = 0
+        self.total_participants = 0
     
     def update_buttons(self):
         self.prev_button.disabled = self.page == 0
         self.next_button.disabled = self.page >= self.max_pages
     
     def get_embed(self):
+        cached = snapshot_cache.get(self.guild_id, self.giveaway_id, self.page)
+        if cached is None:
+            cached = self.render_page()
+            snapshot_cache.put(self.guild_id, self.giveaway_id, self.page, cached)
+        embed, self.total_participants = cached
+        self.max_pages = max(0, (self.total_participants - 1) // self.per_page)
+        self.update_buttons()
+        return embed
+    
+    def render_page(self):
+        """(embed, total participants) for the current page"""
+        guild = bot.get_guild(self.guild_id)
+        if self.archived_ranking is not None:
+            ranking = self.archived_ranking
+        else:
+            ranking = get_ranking(guild, self.giveaway_id)
+        total_participants = len(ranking)
+        total_tickets = ranking.total
+        self.max_pages = max(0, (total_participants - 1) // self.per_page)
+        self.page = min(self.page, self.max_pages)
+        
         status_emoji = "🟢" if self.is_active else "🔴"
-        status_text = "Active" if self.is_active else "Ended"
+        status_text = "Active" if self.is_active else "Ended (archived)" if self.archived_ranking is not None else "Ended"
         
         embed = discord.Embed(
             title=f"🏆 Leaderboard: {self.prize}",
-            description=f"**Giveaway ID:** `{self.giveaway_id}`\n**Status:** {status_emoji} {status_text}\n**Total Participants:** {len(self.member_tickets)}\n**Total Tickets:** {self.total_tickets}",
+            description=f"**Giveaway ID:** `{self.giveaway_id}`\n**Status:** {status_emoji} {status_text}\n**Total Participants:** {total_participants}\n**Total Tickets:** {total_tickets}",
             color=discord.Color.gold() if self.is_active else discord.Color.greyple()
         )
         
         start_idx = self.page * self.per_page
         end_idx = start_idx + self.per_page
-        page_members = self.member_tickets[start_idx:end_idx]
+        guild_invites = invite_data.get(self.guild_id, {})
         
-        for idx, (member, tickets, invites) in enumerate(page_members, start_idx + 1):
+        for idx, (user_id, tickets) in enumerate(ranking.page(start_idx, self.per_page), start_idx + 1):
+            member = guild.get_member(user_id)
+            name = member.display_name if member else f"User {user_id}"
+            record = guild_invites.get(user_id)
+            invites = record.invites if record else 0
             medal = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else f"{idx}."
-            percentage = (tickets / self.total_tickets * 100) if self.total_tickets > 0 else 0
+            percentage = (tickets / total_tickets * 100) if total_tickets > 0 else 0
             embed.add_field(
-                name=f"{medal} {member.display_name}",
+                name=f"{medal} {name}",
                 value=f"🎫 {tickets} tickets ({invites} invites) - {percentage:.1f}% chance",
                 inline=False
             )
         
-        embed.set_footer(text=f"Page {self.page + 1}/{self.max_pages + 1} • Showing {start_idx + 1}-{min(end_idx, len(self.member_tickets))} of {len(self.member_tickets)}")
-        return embed
+        embed.set_footer(text=f"Page {self.page + 1}/{self.max_pages + 1} • Showing {start_idx + 1}-{min(end_idx, total_participants)} of {total_participants}")
+        return embed, total_participants
     
     @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.gray)
+    @metrics.timed('button_seconds', button='leaderboard_previous')
     async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.page = max(0, self.page - 1)
-        self.update_buttons()
         await interaction.response.edit_message(embed=self.get_embed(), view=self)
     
     @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.gray)
+    @metrics.timed('button_seconds', button='leaderboard_next')
     async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.page = min(self.max_pages, self.page + 1)
-        self.update_buttons()
         await interaction.response.edit_message(embed=self.get_embed(), view=self)
 
 @bot.tree.command(name='leaderboard', description='Show the ticket leaderboard for a specific giveaway')
@@ -834,82 +1271,77 @@ class LeaderboardView(discord.ui.View):
 )
 async def leaderboard(interaction: discord.Interaction, giveaway_id: str):
     """Show ticket leaderboard for a specific giveaway"""
-    guild_key = str(interaction.guild.id)
+    guild_id = interaction.guild.id
     
     # Check if giveaway exists
-    if guild_key not in giveaway_data or giveaway_id not in giveaway_data[guild_key]:
+    giveaway = giveaway_data.get(guild_id, {}).get(giveaway_id)
+    if giveaway is None:
         await interaction.response.send_message(f'❌ Giveaway `{giveaway_id}` not found!', ephemeral=True)
         return
     
     # Get giveaway info
-    giveaway = giveaway_data[guild_key][giveaway_id]
-    prize = giveaway['prize']
-    is_active = giveaway.get('active', False)
+    prize = giveaway.prize
+    is_active = giveaway.active
     
     # Get all entries for this giveaway
-    if guild_key not in entries_data or giveaway_id not in entries_data[guild_key]:
+    archived_ranking = None
+    if giveaway.archived_at:
+        # Old giveaways live in the compressed archive; popular ones stay cached
+        archived_ranking = await giveaway_archive.ranking(guild_id, giveaway_id)
+        if archived_ranking is None:
+            await interaction.response.send_message(f'❌ The archived entries of giveaway `{giveaway_id}` are missing!', ephemeral=True)
+            return
+    elif not entry_index.has_giveaway(guild_id, giveaway_id):
         await interaction.response.send_message(f'❌ No entries found for giveaway `{giveaway_id}`!', ephemeral=True)
         return
     
-    # Get all members and their tickets for this giveaway
-    member_tickets = []
-    for user_id in entries_data[guild_key][giveaway_id]:
-        member = interaction.guild.get_member(int(user_id))
-        if member and not member.bot:
-            tickets = get_user_tickets(interaction.guild.id, int(user_id), giveaway_id)
-            invites = 0
-            user_key = str(user_id)
-            if guild_key in invite_data and user_key in invite_data[guild_key]:
-                invites = invite_data[guild_key][user_key]['invites']
-            member_tickets.append((member, tickets, invites))
-    
-    if not member_tickets:
+    # Create view with pagination (the first page usually comes from the snapshot cache)
+    view = LeaderboardView(interaction.guild, prize, giveaway_id, is_active, archived_ranking=archived_ranking)
+    embed = view.get_embed()
+    if not view.total_participants:
         await interaction.response.send_message(f'❌ No valid entries found for giveaway `{giveaway_id}`!', ephemeral=True)
         return
     
-    # Sort by ticket count
-    member_tickets.sort(key=lambda x: x[1], reverse=True)
-    
-    # Calculate total tickets
-    total_tickets = sum(t[1] for t in member_tickets)
-    
-    # Create view with pagination
-    view = LeaderboardView(member_tickets, prize, giveaway_id, is_active, total_tickets)
-    embed = view.get_embed()
-    
     await interaction.response.send_message(embed=embed, view=view)
 
 @bot.tree.command(name='gstatus', description='Check current giveaway status')
 async def giveaway_status(interaction: discord.Interaction):
     """Check current giveaway status"""
-    guild_key = str(interaction.guild.id)
-    
-    if guild_key not in giveaway_data or not giveaway_data[guild_key].get('active'):
+    guild_id = interaction.guild.id
+    
+    # Most recently created active giveaway
+    active = [
+        (giveaway.created_at or '', giveaway_id)
+        for giveaway_id, giveaway in giveaway_data.get(guild_id, {}).items()
+        if giveaway.active
+    ]
+    if not active:
         await interaction.response.send_message('❌ There is no active giveaway right now.', ephemeral=True)
         return
     
-    prize = giveaway_data[guild_key]['prize']
+    giveaway_id = max(active)[1]
     
-    # Count entries
-    total_entries = len(entries_data.get(guild_key, []))
-    
-    # Count total tickets from entries
-    total_tickets = 0
-    if guild_key in entries_data:
-        for user_id in entries_data[guild_key]:
-            total_tickets += get_user_tickets(interaction.guild.id, int(user_id))
+    # Shared part of the status (prize and totals) comes from the snapshot cache
+    status_embed = snapshot_cache.get(guild_id, giveaway_id, 'status')
+    if status_embed is None:
+        prize = giveaway_data[guild_id][giveaway_id].prize
+        total_entries = entry_index.count(guild_id, giveaway_id)
+        total_tickets = evaluate_giveaway(interaction.guild, giveaway_id).total
+        
+        status_embed = discord.Embed(
+            title="🎉 Active Giveaway",
+            description=f"**Prize:** {prize}\n**Giveaway ID:** `{giveaway_id}`",
+            color=discord.Color.blue()
+        )
+        status_embed.add_field(name="Total Participants", value=f"{total_entries}", inline=True)
+        status_embed.add_field(name="Total Tickets", value=f"{total_tickets}", inline=True)
+        snapshot_cache.put(guild_id, giveaway_id, 'status', status_embed)
     
     # Check if user entered
-    user_entered = str(interaction.user.id) in entries_data.get(guild_key, [])
-    user_tickets = get_user_tickets(interaction.guild.id, interaction.user.id) if user_entered else 0
+    user_entered = entry_index.contains(guild_id, giveaway_id, interaction.user.id)
+    user_tickets = get_user_tickets(interaction.guild.id, interaction.user.id, giveaway_id) if user_entered else 0
     
-    embed = discord.Embed(
-        title="🎉 Active Giveaway",
-        description=f"**Prize:** {prize}",
-        color=discord.Color.blue()
-    )
-    embed.add_field(name="Total Participants", value=f"{total_entries}", inline=True)
-    embed.add_field(name="Total Tickets", value=f"{total_tickets}", inline=True)
+    embed = status_embed.copy()
     embed.add_field(
         name="Your Status",
         value=f"{'✅ Entered' if user_entered else '❌ Not Entered'}",
@@ -928,24 +1360,35 @@ async def giveaway_status(interaction: discord.Interaction):
 @discord.app_commands.checks.has_permissions(administrator=True)
 async def clear_giveaway(interaction: discord.Interaction):
     """Clear giveaway data (Admin only)"""
-    guild_key = str(interaction.guild.id)
+    guild_id = interaction.guild.id
+    # Deleting the archive may wait for an archive write in progress
+    await interaction.response.defer(ephemeral=True, thinking=True)
     
     # Clear giveaway data
-    if guild_key in giveaway_data:
-        giveaway_data[guild_key] = {'active': False}
+    if guild_id in giveaway_data:
+        for giveaway_id, giveaway in giveaway_data[guild_id].items():
+            giveaway_scheduler.cancel(guild_id, giveaway_id)
+            active_giveaways.pop(giveaway.message_id, None)
+        giveaway_data[guild_id] = {}
         save_giveaway_data()
     
     # Clear entries
-    if guild_key in entries_data:
-        entries_data[guild_key] = []
+    if guild_id in entry_index.by_giveaway:
+        entry_index.clear_guild(guild_id)
+        guild_tickets_changed(guild_id)
         save_entries_data()
     
+    # Clear archived giveaways, after any archive write in progress for the guild
+    async with giveaway_archive.guild_lock(guild_id):
+        giveaway_archive.clear_guild(guild_id)
+    
     # Clear invite data
-    if guild_key in invite_data:
-        invite_data[guild_key] = {}
+    if guild_id in invite_data:
+        invite_data[guild_id] = {}
+        guild_tickets_changed(guild_id)
         save_invite_data()
     
-    await interaction.response.send_message('✅ Giveaway data has been cleared! You can now start a new giveaway.', ephemeral=True)
+    await interaction.followup.send('✅ Giveaway data has been cleared! You can now start a new giveaway.', ephemeral=True)
 
 @bot.tree.command(name='commands', description='Show all available commands')
 async def bot_commands(interaction: discord.Interaction):
@@ -994,20 +1437,248 @@ async def bot_commands(interaction: discord.Interaction):
 @discord.app_commands.checks.has_permissions(administrator=True)
 async def debug_invites(interaction: discord.Interaction):
     """Debug invite data"""
-    guild_key = str(interaction.guild.id)
+    guild_id = interaction.guild.id
     
-    if guild_key not in invite_data or not invite_data[guild_key]:
+    if not invite_data.get(guild_id):
         await interaction.response.send_message('❌ No invite data found for this server!', ephemeral=True)
         return
     
     debug_text = "**Invite Data:**\n"
-    for user_id, data in invite_data[guild_key].items():
-        member = interaction.guild.get_member(int(user_id))
+    for user_id, record in invite_data[guild_id].items():
+        member = interaction.guild.get_member(user_id)
         name = member.display_name if member else f"User {user_id}"
-        debug_text += f"{name}: {data['invites']} invites\n"
+        debug_text += f"{name}: {record.invites} invites\n"
+        if len(debug_text) > MESSAGE_LIMIT:
+            # Too long for one message, send everything as a file instead
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            await send_export(
+                interaction, invite_rows(interaction.guild), INVITE_EXPORT_FIELDS, 'csv',
+                f'invites-{guild_id}', '📎 Invite data for {count} users (too long for a message)'
+            )
+            return
     
     await interaction.response.send_message(debug_text, ephemeral=True)
 
+MESSAGE_LIMIT = 2000  # Discord's message length limit
+ENTRANT_EXPORT_FIELDS = ['user_id', 'name', 'eligible', 'tickets', 'invites', 'invite_bonus', 'manual_bonus', 'role_bonus']
+INVITE_EXPORT_FIELDS = ['user_id', 'name', 'in_server', 'invites', 'manual_bonus']
+
+def entrant_rows(guild, giveaway_id):
+    """One row per entrant, in entry order, with their tickets and where they come from"""
+    guild_invites = invite_data.get(guild.id, {})
+    # Copy the IDs so entries arriving during a long export don't break the iteration
+    for user_id in array('Q', entry_index.entrants(guild.id, giveaway_id)):
+        member = guild.get_member(user_id)
+        eligible = member is not None and not member.bot
+        # Computed directly so a one-off export doesn't fill the ticket cache
+        invite_bonus, manual_bonus, role_bonus = compute_ticket_bonuses(guild.id, user_id)
+        record = guild_invites.get(user_id)
+        yield {
+            'user_id': str(user_id),
+            'name': member.display_name if member else '',
+            'eligible': eligible,
+            'tickets': 1 + invite_bonus + manual_bonus + role_bonus if eligible else 0,
+            'invites': record.invites if record else 0,
+            'invite_bonus': invite_bonus,
+            'manual_bonus': manual_bonus,
+            'role_bonus': role_bonus,
+        }
+
+def invite_rows(guild):
+    """One row per user with invite data"""
+    for user_id, record in list(invite_data.get(guild.id, {}).items()):
+        member = guild.get_member(user_id)
+        yield {
+            'user_id': str(user_id),
+            'name': member.display_name if member else '',
+            'in_server': member is not None,
+            'invites': record.invites,
+            'manual_bonus': record.manual_bonus,
+        }
+
+async def send_export(interaction, rows, fieldnames, fmt, name, message):
+    """Stream rows into a gzipped attachment and send it as a follow-up (the interaction must be deferred)"""
+    path, count = await export.export_gzip(rows, fieldnames, fmt)
+    try:
+        size = os.path.getsize(path)
+        if size > interaction.guild.filesize_limit:
+            await interaction.followup.send(
+                f'❌ The export is {size / 1024 / 1024:.1f} MB, over this server\'s {interaction.guild.filesize_limit / 1024 / 1024:.0f} MB upload limit.',
+                ephemeral=True
+            )
+            return
+        await interaction.followup.send(message.format(count=count), file=discord.File(path, filename=f'{name}.{fmt}.gz'), ephemeral=True)
+    finally:
+        os.unlink(path)
+
+@bot.tree.command(name='exportentries', description='Export every entrant of a giveaway with their tickets (Admin only)')
+@discord.app_commands.describe(
+    giveaway_id='The ID of the giveaway to export',
+    format='csv (spreadsheets) or ndjson (one JSON object per line)'
+)
+@discord.app_commands.choices(format=[
+    discord.app_commands.Choice(name='csv', value='csv'),
+    discord.app_commands.Choice(name='ndjson', value='ndjson'),
+])
+@discord.app_commands.checks.has_permissions(administrator=True)
+async def export_entries(interaction: discord.Interaction, giveaway_id: str, format: str = 'csv'):
+    """Export a giveaway's entrants as a compressed file"""
+    giveaway = giveaway_data.get(interaction.guild.id, {}).get(giveaway_id)
+    if giveaway is None:
+        await interaction.response.send_message(f'❌ Giveaway `{giveaway_id}` not found!', ephemeral=True)
+        return
+    if giveaway.archived_at:
+        await interaction.response.send_message(f'❌ Giveaway `{giveaway_id}` has been archived, only its `/leaderboard` is still available.', ephemeral=True)
+        return
+    
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    await send_export(
+        interaction, entrant_rows(interaction.guild, giveaway_id), ENTRANT_EXPORT_FIELDS, format,
+        f'entrants-{giveaway_id}', f'📎 {{count}} entrants of giveaway `{giveaway_id}`'
+    )
+
+def active_giveaway_stats():
+    """(active giveaways, their total entrants) across all guilds"""
+    active = entrants = 0
+    for guild_id, giveaways in giveaway_data.items():
+        for giveaway_id, giveaway in giveaways.items():
+            if giveaway.active:
+                active += 1
+                entrants += entry_index.count(guild_id, giveaway_id)
+    return active, entrants
+
+metrics.gauge('active_giveaways', lambda: active_giveaway_stats()[0], 'Giveaways currently running')
+metrics.gauge('active_entrants', lambda: active_giveaway_stats()[1], 'Entries across running giveaways')
+metrics.gauge('pending_timers', lambda: giveaway_scheduler.pending, 'Giveaways waiting for their end time')
+metrics.gauge('guilds', lambda: len(bot.guilds), 'Servers the bot is in')
+metrics.gauge('ticket_cache_entries', lambda: len(ticket_cache), 'Cached per-user ticket bonuses')
+metrics.gauge('snapshot_cache_entries', lambda: len(snapshot_cache), 'Cached leaderboard/status embeds')
+metrics.gauge('archive_cache_entries', lambda: len(giveaway_archive), 'Archived leaderboards held in memory')
+metrics.gauge('pending_saves', lambda: int(store.has_pending()), '1 while changes are waiting to be written')
+metrics.gauge('entry_queue_depth', lambda: entry_queue.depth, 'Enter-button replies waiting to be sent')
+metrics.gauge('entry_queue_rejected', lambda: entry_queue.stats['rejected'], 'Clicks turned away because the entry queue was full')
+metrics.gauge('gateway_events_per_second', lambda: {(('shard', shard_id),): round(rate, 2) for shard_id, rate in shard_monitor.rates.items()}, 'Gateway events received per second, per shard')
+metrics.gauge('uptime_seconds', lambda: round(time.time() - metrics.started_at), 'Seconds since the bot started')
+
+def format_latencies(name, label=None, limit=10):
+    """Lines of calls, average and p99 latency per label value, busiest first"""
+    rows = [(labels, histogram) for (metric, labels), histogram in metrics.histograms.items() if metric == name]
+    rows.sort(key=lambda row: row[1].count, reverse=True)
+    lines = []
+    for labels, histogram in rows[:limit]:
+        label_value = dict(labels).get(label) if label else name[:-len('_seconds')]
+        errors = metrics.counters.get((name.replace('_seconds', '_errors_total'), labels), 0)
+        line = f"`{label_value}` {histogram.count}× • avg {histogram.sum / histogram.count * 1000:.1f}ms • p99 {histogram.quantile(0.99) * 1000:.1f}ms"
+        if errors:
+            line += f" • ⚠️ {errors} errors"
+        lines.append(line)
+    return lines
+
+def stats_field(*line_groups):
+    return "\n".join(line for lines in line_groups for line in lines) or "No data yet"
+
+@bot.tree.command(name='botstats', description='Show bot performance metrics (Admin only)')
+@discord.app_commands.checks.has_permissions(administrator=True)
+async def bot_stats(interaction: discord.Interaction):
+    """Show latency and load metrics"""
+    active, entrants = active_giveaway_stats()
+    uptime = timedelta(seconds=round(time.time() - metrics.started_at))
+    embed = discord.Embed(
+        title="📈 Bot Stats",
+        description=(
+            f"**Uptime:** {uptime}\n**Servers:** {len(bot.guilds)}\n"
+            f"**Active Giveaways:** {active} ({entrants} entrants)\n**Pending Timers:** {giveaway_scheduler.pending}\n"
+            f"**Gateway Latency:** {bot.latency * 1000:.0f}ms\n"
+            f"**Gateway Events/sec:** {', '.join(f'shard {shard_id}: {rate:.1f}' for shard_id, rate in sorted(shard_monitor.rates.items())) or 'measuring...'}\n"
+            f"**Event Loop Lag:** p99 {loop_monitor.percentiles()[1] * 1000:.1f}ms • max {loop_monitor.max_lag * 1000:.0f}ms • {loop_monitor.stalls} stalls"
+        ),
+        color=discord.Color.teal()
+    )
+    embed.add_field(name="Slash Commands", value=stats_field(format_latencies('command_seconds', 'command')), inline=False)
+    embed.add_field(name="Buttons", value=stats_field(format_latencies('button_seconds', 'button')), inline=False)
+    embed.add_field(
+        name="Giveaway Work",
+        value=stats_field(*(format_latencies(name) for name in ('draw_seconds', 'ticket_evaluation_seconds', 'invite_fetch_seconds'))),
+        inline=False
+    )
+    embed.add_field(
+        name="Persistence",
+        value=stats_field(
+            format_latencies('save_seconds', 'dataset'),
+            format_latencies('storage_write_seconds'),
+            [f"Flushes: {store.stats['flushes']} • Errors: {store.stats['errors']} • Max staleness: {store.stats['max_staleness']:.2f}s"]
+        ),
+        inline=False
+    )
+    embed.add_field(
+        name="Caches",
+        value=(
+            f"Tickets: {ticket_cache.hits} hits / {ticket_cache.misses} misses\n"
+            f"Snapshots: {snapshot_cache.hits} hits / {snapshot_cache.misses} misses\n"
+            f"Archived leaderboards: {giveaway_archive.hits} hits / {giveaway_archive.misses} loads\n"
+            f"Invite fetches saved by batching: {invite_coordinator.fetches_saved}"
+        ),
+        inline=False
+    )
+    embed.add_field(
+        name="Entry Queue",
+        value=(
+            f"Depth: {entry_queue.depth}/{entry_queue.max_depth} (max {entry_queue.stats['max_depth']}) • "
+            f"Max wait: {entry_queue.stats['max_wait'] * 1000:.0f}ms\n"
+            f"Admitted: {entry_queue.stats['admitted']} • Rejected: {entry_queue.stats['rejected']} • Failed replies: {entry_queue.stats['failed']}"
+        ),
+        inline=False
+    )
+    if METRICS_PORT:
+        embed.set_footer(text=f"Prometheus metrics on {METRICS_HOST}:{METRICS_PORT}/metrics")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+profile_lock = asyncio.Lock()  # One profiler at a time (cProfile can't nest)
+
+@bot.tree.command(name='profile', description='Profile the bot for a few seconds and get a report file (Admin only)')
+@discord.app_commands.describe(
+    seconds='How long to profile (1-120)',
+    mode='cprofile: exact call counts, slower; sampling: low overhead, safe on a busy bot',
+    memory='Also trace allocations and measure the size of the bot\'s data'
+)
+@discord.app_commands.choices(mode=[
+    discord.app_commands.Choice(name='sampling', value='sampling'),
+    discord.app_commands.Choice(name='cprofile', value='cprofile'),
+])
+@discord.app_commands.checks.has_permissions(administrator=True)
+async def profile_bot(interaction: discord.Interaction, seconds: int = 10, mode: str = 'sampling', memory: bool = False):
+    """Run a profiler on the live bot and attach the results"""
+    if profile_lock.locked():
+        await interaction.response.send_message('❌ A profile is already running, try again when it finishes.', ephemeral=True)
+        return
+    seconds = max(1, min(seconds, 120))
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    
+    async with profile_lock:
+        traced_here = profiling.start_tracemalloc() if memory else False
+        started_at = datetime.now()
+        if mode == 'cprofile':
+            report = await profiling.run_cprofile(seconds)
+        else:
+            report = await profiling.run_sampling(seconds)
+        
+        sections = [f"Profile of {bot.user} started {started_at.isoformat(timespec='seconds')}, {seconds}s, mode={mode}", report]
+        if memory:
+            sections.append(profiling.tracemalloc_report(traced_here))
+            sections.append(profiling.size_report({
+                'giveaway_data': giveaway_data,
+                'entries_data (entry index)': entry_index,
+                'invite_data': invite_data,
+                'inviter_tracking': inviter_tracking,
+                'invites (invite cache)': invites,
+                'ticket_cache': ticket_cache,
+                'leaderboard_rankings': leaderboard_rankings,
+                'snapshot_cache': snapshot_cache,
+            }))
+    
+    report_file = discord.File(io.BytesIO("\n\n".join(sections).encode()), filename=f"profile-{started_at:%Y%m%d-%H%M%S}.txt")
+    await interaction.followup.send(f'📎 {mode} profile over {seconds}s', file=report_file, ephemeral=True)
+
 @bot.tree.command(name='addtickets', description='Manually add bonus tickets to a user (Admin only)')
 @discord.app_commands.describe(
     user='The user to give bonus tickets to',
@@ -1016,26 +1687,22 @@ async def debug_invites(interaction: discord.Interaction):
 @discord.app_commands.checks.has_permissions(administrator=True)
 async def add_tickets(interaction: discord.Interaction, user: discord.Member, tickets: int):
     """Manually add bonus tickets to a user"""
-    guild_key = str(interaction.guild.id)
-    user_key = str(user.id)
+    guild_id = interaction.guild.id
     
     # Initialize data structures
-    if guild_key not in invite_data:
-        invite_data[guild_key] = {}
-    
-    if user_key not in invite_data[guild_key]:
-        invite_data[guild_key][user_key] = {'invites': 0, 'manual_bonus': 0}
-    
-    if 'manual_bonus' not in invite_data[guild_key][user_key]:
-        invite_data[guild_key][user_key]['manual_bonus'] = 0
+    guild_invites = invite_data.setdefault(guild_id, {})
+    record = guild_invites.get(user.id)
+    if record is None:
+        record = guild_invites[user.id] = InviteRecord(0, 0)
     
     # Add bonus tickets
-    invite_data[guild_key][user_key]['manual_bonus'] += tickets
+    record.manual_bonus += tickets
+    tickets_changed(guild_id, user.id)
     save_invite_data()
     
     # Get updated ticket count
     total_tickets = get_user_tickets(interaction.guild.id, user.id)
-    manual_bonus = invite_data[guild_key][user_key]['manual_bonus']
+    manual_bonus = record.manual_bonus
     
     action = "added" if tickets > 0 else "removed"
     await interaction.response.send_message(
@@ -1052,26 +1719,22 @@ async def add_tickets(interaction: discord.Interaction, user: discord.Member, ti
 @discord.app_commands.checks.has_permissions(administrator=True)
 async def remove_tickets(interaction: discord.Interaction, user: discord.Member, tickets: int):
     """Remove bonus tickets from a user"""
-    guild_key = str(interaction.guild.id)
-    user_key = str(user.id)
+    guild_id = interaction.guild.id
     
     # Initialize data structures
-    if guild_key not in invite_data:
-        invite_data[guild_key] = {}
-    
-    if user_key not in invite_data[guild_key]:
-        invite_data[guild_key][user_key] = {'invites': 0, 'manual_bonus': 0}
-    
-    if 'manual_bonus' not in invite_data[guild_key][user_key]:
-        invite_data[guild_key][user_key]['manual_bonus'] = 0
+    guild_invites = invite_data.setdefault(guild_id, {})
+    record = guild_invites.get(user.id)
+    if record is None:
+        record = guild_invites[user.id] = InviteRecord(0, 0)
     
     # Remove bonus tickets (make tickets negative)
-    invite_data[guild_key][user_key]['manual_bonus'] -= tickets
+    record.manual_bonus -= tickets
+    tickets_changed(guild_id, user.id)
     save_invite_data()
     
     # Get updated ticket count
     total_tickets = get_user_tickets(interaction.guild.id, user.id)
-    manual_bonus = invite_data[guild_key][user_key]['manual_bonus']
+    manual_bonus = record.manual_bonus
     
     await interaction.response.send_message(
         f'✅ Removed {tickets} bonus ticket(s) from {user.mention}!\n'
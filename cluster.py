@@ -0,0 +1,164 @@
+"""Run the bot as a cluster of processes, each owning a contiguous range of shards.
+
+    python cluster.py                          # Discord's recommended shard count, one process per CPU
+    python cluster.py --shards 16 --processes 4
+
+Every process runs bot.py as an AutoShardedBot for its shards (SHARD_COUNT, SHARD_IDS
+and CLUSTER_ID are set for it) and loads/saves only its own guilds' data from the shared
+sqlite database in DATA_DIR. Crashed processes are restarted, and events/sec per shard
+is printed from the status files the processes write.
+"""
+import argparse
+import glob
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+import storage
+from sharding import split_shards, status_dir
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = '/app/data' if os.path.exists('/app/data') else '.'
+
+
+def recommended_shards(token):
+    """Shard count Discord recommends for the bot (GET /gateway/bot)"""
+    request = urllib.request.Request(
+        'https://discord.com/api/v10/gateway/bot',
+        headers={'Authorization': f'Bot {token}', 'User-Agent': 'DiscordBot (giveaway-bot cluster launcher)'}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+
+def print_shard_report(data_dir, stale_after=60):
+    rows = []
+    now = time.time()
+    for path in sorted(glob.glob(os.path.join(status_dir(data_dir), 'cluster-*.json'))):
+        try:
+            with open(path) as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        stale = now - status.get('updated_at', 0) > stale_after
+        for shard_id, shard in status.get('shards', {}).items():
+            rows.append((int(shard_id), status.get('cluster'), shard, stale))
+    if not rows:
+        return
+    total = sum(shard['events_per_sec'] for _, _, shard, stale in rows if not stale)
+    print(f'Cluster: {total:.1f} gateway events/sec across {len(rows)} shard(s)')
+    for shard_id, cluster_id, shard, stale in sorted(rows, key=lambda row: row[0]):
+        latency = f"{shard['latency_ms']}ms" if shard['latency_ms'] is not None else '-'
+        note = ' (stale)' if stale else ''
+        print(f"  shard {shard_id:>3} (cluster {cluster_id}): {shard['events_per_sec']:8.1f} events/sec, "
+              f"{shard['guilds']} guilds, latency {latency}{note}")
+
+
+class Cluster:
+    def __init__(self, shard_count, processes, data_dir):
+        self.shard_count = shard_count
+        self.ranges = split_shards(shard_count, processes)
+        self.data_dir = data_dir
+        self.children = {}  # {cluster_id: Popen}
+        self.restarts = {}  # {cluster_id: (count, next allowed start)}
+        self.stopping = False
+
+    def spawn(self, cluster_id):
+        shard_ids = self.ranges[cluster_id]
+        env = dict(
+            os.environ,
+            SHARD_COUNT=str(self.shard_count),
+            SHARD_IDS=f'{shard_ids[0]}-{shard_ids[-1]}',
+            CLUSTER_ID=str(cluster_id),
+            STORAGE_BACKEND='sqlite',
+        )
+        metrics_port = int(os.getenv('METRICS_PORT', '0'))
+        if metrics_port:
+            env['METRICS_PORT'] = str(metrics_port + cluster_id)  # One port per process, they can't share it
+        self.children[cluster_id] = subprocess.Popen([sys.executable, os.path.join(ROOT, 'bot.py')], cwd=ROOT, env=env)
+        print(f'Started cluster {cluster_id} (shards {shard_ids[0]}-{shard_ids[-1]} of {self.shard_count}), pid {self.children[cluster_id].pid}')
+
+    def start(self):
+        for cluster_id in range(len(self.ranges)):
+            self.spawn(cluster_id)
+
+    def check(self):
+        """Restart processes that exited, backing off if one keeps crashing"""
+        now = time.monotonic()
+        for cluster_id, child in list(self.children.items()):
+            if child.poll() is None:
+                continue
+            count, not_before = self.restarts.get(cluster_id, (0, 0))
+            if now < not_before:
+                continue
+            print(f'Cluster {cluster_id} exited with code {child.returncode}, restarting')
+            self.restarts[cluster_id] = (count + 1, now + min(300, 5 * 2 ** count))
+            self.spawn(cluster_id)
+
+    def stop(self, timeout=30):
+        self.stopping = True
+        for child in self.children.values():
+            if child.poll() is None:
+                child.terminate()  # bot.py flushes its data on SIGTERM
+        deadline = time.monotonic() + timeout
+        for child in self.children.values():
+            try:
+                child.wait(max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                child.kill()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Run the giveaway bot as a multi-process shard cluster')
+    parser.add_argument('--shards', default=os.getenv('SHARD_COUNT', 'auto'), help="Total shard count, or 'auto' for Discord's recommendation")
+    parser.add_argument('--processes', type=int, default=int(os.getenv('CLUSTER_PROCESSES', os.cpu_count() or 1)), help='Number of bot processes')
+    parser.add_argument('--report-interval', type=float, default=60, help='Seconds between events/sec reports')
+    args = parser.parse_args()
+
+    if args.shards == 'auto':
+        token = os.getenv('DISCORD_BOT_TOKEN')
+        if not token:
+            print('Error: DISCORD_BOT_TOKEN environment variable not set!')
+            sys.exit(1)
+        shard_count = recommended_shards(token)
+        print(f'Discord recommends {shard_count} shard(s)')
+    else:
+        shard_count = int(args.shards)
+
+    # Migrate JSON data into the shared database once, before the processes race to do it
+    backend = storage.SqliteBackend(os.path.join(DATA_DIR, 'giveaway_bot.db'), data_dir=DATA_DIR)
+    backend.ensure_schema()
+    backend.close()
+    os.makedirs(status_dir(DATA_DIR), exist_ok=True)
+    for path in glob.glob(os.path.join(status_dir(DATA_DIR), 'cluster-*.json')):
+        os.unlink(path)  # Leftovers from a previous run with a different layout
+
+    cluster = Cluster(shard_count, args.processes, DATA_DIR)
+
+    def shutdown(signum, frame):
+        print('Stopping cluster...')
+        cluster.stop()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    cluster.start()
+    next_report = time.monotonic() + args.report_interval
+    while True:
+        time.sleep(1)
+        cluster.check()
+        if time.monotonic() >= next_report:
+            print_shard_report(DATA_DIR)
+            next_report = time.monotonic() + args.report_interval
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import heapq
+import math
+import random
+
+
+def draw_winners(weighted_entries, num_winners, rng=random):
+    """Pick up to num_winners distinct users from (user_id, tickets) pairs.
+
+    Equivalent to repeatedly drawing one ticket from the pool and then removing all of
+    that winner's tickets, but without expanding the pool: each user gets the key
+    log(U) / tickets (Efraimidis-Spirakis exponential keys) and the largest keys win.
+    Runs in O(n log k) time and O(k) extra memory for n users and k winners.
+
+    Returns (winner_ids, total_tickets). Users with zero or negative tickets can't win
+    and don't count toward the total, the same as an empty slot in the ticket pool.
+    """
+    total_tickets = 0
+    heap = []  # Min-heap of the num_winners largest (key, order, user_id) seen so far
+    for order, (user_id, tickets) in enumerate(weighted_entries):
+        if tickets <= 0:
+            continue
+        total_tickets += tickets
+        # 1 - random() is in (0, 1], so the log is always defined
+        item = (math.log(1.0 - rng.random()) / tickets, order, user_id)
+        if len(heap) < num_winners:
+            heapq.heappush(heap, item)
+        elif heap and item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    heap.sort(reverse=True)
+    return [user_id for _, _, user_id in heap], total_tickets
@@ -0,0 +1,137 @@
+from array import array
+
+
+class EntryIndex:
+    """In-memory index of giveaway entries, keyed by int guild and user IDs.
+
+    by_giveaway: {guild_id: {giveaway_id: array('Q')}} - user IDs in entry order, 8 bytes
+                 per entry
+    by_user:     {guild_id: {user_id: (giveaway_id, ...)}} - reverse index, which also
+                 answers "has this user entered this giveaway" in O(1). Users are
+                 rarely in more than one or two giveaways, so a tuple beats a set, and
+                 equal tuples are shared (most users point at the same one).
+
+    load() and to_json() convert from and to the on-disk
+    {guild_id: {giveaway_id: [user_ids]}} format with string IDs. For background saves,
+    copy() takes a cheap copy of the arrays and encode() converts that off the event loop.
+    """
+
+    def __init__(self):
+        self.by_giveaway = {}
+        self.by_user = {}
+        self._tuples = {}  # Interned giveaway ID tuples
+
+    def _with(self, giveaways, giveaway_id):
+        combined = giveaways + (giveaway_id,)
+        return self._tuples.setdefault(combined, combined)
+
+    def load(self, entries_data):
+        """Replace the index contents with loaded {guild_id: {giveaway_id: [user_ids]}} data"""
+        self.by_giveaway.clear()
+        self.by_user.clear()
+        self._tuples.clear()
+        for guild_key, guild_entries in entries_data.items():
+            guild_id = int(guild_key)
+            self.by_giveaway[guild_id] = {}
+            if not isinstance(guild_entries, dict):
+                continue
+            guild_users = self.by_user.setdefault(guild_id, {})
+            for giveaway_id, users in guild_entries.items():
+                entrants = self.by_giveaway[guild_id][giveaway_id] = array('Q')
+                for user_key in users:
+                    user_id = int(user_key)
+                    giveaways = guild_users.get(user_id, ())
+                    if giveaway_id in giveaways:
+                        continue  # Duplicate entry in old data
+                    guild_users[user_id] = self._with(giveaways, giveaway_id)
+                    entrants.append(user_id)
+
+    def to_json(self):
+        """Entries in the on-disk {guild_id: {giveaway_id: [user_ids]}} format"""
+        return self.encode(self.copy())
+
+    def copy(self):
+        """{guild_id: {giveaway_id: array('Q')}} copied with one memcpy per giveaway"""
+        return {
+            guild_id: {giveaway_id: users[:] for giveaway_id, users in guild_entries.items()}
+            for guild_id, guild_entries in self.by_giveaway.items()
+        }
+
+    @staticmethod
+    def encode(entries):
+        """copy() output in the on-disk format with string IDs"""
+        return {
+            str(guild_id): {giveaway_id: list(map(str, users)) for giveaway_id, users in guild_entries.items()}
+            for guild_id, guild_entries in entries.items()
+        }
+
+    def ensure_giveaway(self, guild_id, giveaway_id):
+        """Create an empty entry list for a giveaway if it doesn't have one"""
+        guild_entries = self.by_giveaway.setdefault(guild_id, {})
+        entrants = guild_entries.get(giveaway_id)
+        if entrants is None:
+            entrants = guild_entries[giveaway_id] = array('Q')
+        return entrants
+
+    def reset_giveaway(self, guild_id, giveaway_id):
+        """Start a giveaway with no entries"""
+        for user_id in self.by_giveaway.get(guild_id, {}).get(giveaway_id, ()):
+            self._forget(guild_id, user_id, giveaway_id)
+        self.by_giveaway.setdefault(guild_id, {})[giveaway_id] = array('Q')
+
+    def drop_giveaway(self, guild_id, giveaway_id):
+        """Remove a giveaway and its entries from the index"""
+        for user_id in self.by_giveaway.get(guild_id, {}).pop(giveaway_id, ()):
+            self._forget(guild_id, user_id, giveaway_id)
+
+    def clear_guild(self, guild_id):
+        """Drop every entry in a guild"""
+        self.by_giveaway[guild_id] = {}
+        self.by_user.pop(guild_id, None)
+
+    def add(self, guild_id, giveaway_id, user_id):
+        """Enter a user; returns False if they were already entered"""
+        entrants = self.ensure_giveaway(guild_id, giveaway_id)
+        guild_users = self.by_user.setdefault(guild_id, {})
+        giveaways = guild_users.get(user_id, ())
+        if giveaway_id in giveaways:
+            return False
+        guild_users[user_id] = self._with(giveaways, giveaway_id)
+        entrants.append(user_id)
+        return True
+
+    def _forget(self, guild_id, user_id, giveaway_id):
+        guild_users = self.by_user.get(guild_id, {})
+        giveaways = guild_users.get(user_id)
+        if giveaways is not None:
+            giveaways = tuple(g for g in giveaways if g != giveaway_id)
+            if giveaways:
+                guild_users[user_id] = self._tuples.setdefault(giveaways, giveaways)
+            else:
+                del guild_users[user_id]
+
+    def contains(self, guild_id, giveaway_id, user_id):
+        """Has the user entered this giveaway"""
+        return giveaway_id in self.by_user.get(guild_id, {}).get(user_id, ())
+
+    def has_entries(self, guild_id, giveaway_id):
+        return bool(self.by_giveaway.get(guild_id, {}).get(giveaway_id))
+
+    def has_giveaway(self, guild_id, giveaway_id):
+        """Is there an entry list (possibly empty) for this giveaway"""
+        return giveaway_id in self.by_giveaway.get(guild_id, {})
+
+    def has_entered_any(self, guild_id, user_id):
+        """Has the user entered any giveaway in the guild"""
+        return user_id in self.by_user.get(guild_id, {})
+
+    def entrants(self, guild_id, giveaway_id):
+        """User IDs of a giveaway in entry order (the live array; copy it to iterate across awaits)"""
+        return self.by_giveaway.get(guild_id, {}).get(giveaway_id, array('Q'))
+
+    def count(self, guild_id, giveaway_id):
+        return len(self.by_giveaway.get(guild_id, {}).get(giveaway_id, ()))
+
+    def user_giveaways(self, guild_id, user_id):
+        """Giveaway IDs the user has entered in the guild"""
+        return self.by_user.get(guild_id, {}).get(user_id, ())
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+
+class EntryQueue:
+    """Bounded queue of deferred enter-button replies, drained by a few workers.
+
+    A click is acknowledged (deferred) and recorded in memory straight away. The
+    ticket count and follow-up message are sent later by one of `workers` tasks.
+    Past `max_depth` queued replies, admit() turns new clicks away, so a spike can't
+    pile up unbounded work on the event loop that also runs the gateway heartbeat.
+    """
+
+    def __init__(self, handle, workers=4, max_depth=1000):
+        self._handle = handle  # async handle(job)
+        self.workers = workers
+        self.max_depth = max_depth
+        self._queue = None  # Created in start(), on the running loop
+        self._tasks = []
+        self.stats = {'admitted': 0, 'rejected': 0, 'processed': 0, 'failed': 0, 'max_depth': 0, 'max_wait': 0.0}
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def admit(self):
+        """True if there's room for another click; counts the rejection otherwise"""
+        if self.depth >= self.max_depth:
+            self.stats['rejected'] += 1
+            return False
+        return True
+
+    def submit(self, job):
+        self._queue.put_nowait((time.monotonic(), job))
+        self.stats['admitted'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], self._queue.qsize())
+
+    async def drain(self):
+        """Wait until every queued reply has been sent"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._work()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self):
+        while True:
+            queued_at, job = await self._queue.get()
+            self.stats['max_wait'] = max(self.stats['max_wait'], time.monotonic() - queued_at)
+            try:
+                await self._handle(job)
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f'Failed to reply to a giveaway entry: {e}')
+            finally:
+                self._queue.task_done()
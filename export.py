@@ -0,0 +1,59 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+# Compression and disk writes happen here, off the event loop
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-writer')
+
+
+def _format_chunk(rows, fieldnames, fmt, header):
+    out = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=fieldnames, extrasaction='ignore')
+        if header:
+            writer.writeheader()
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            out.write(json.dumps(row, separators=(',', ':')))
+            out.write('\n')
+    return out.getvalue().encode()
+
+
+async def export_gzip(rows, fieldnames, fmt='csv', chunk_rows=2000):
+    """Stream rows (dicts) into a gzipped CSV or NDJSON temp file; returns (path, row count).
+
+    Rows are pulled from the iterator `chunk_rows` at a time on the event loop, and each
+    formatted chunk is compressed and written on a worker thread. Between chunks the loop
+    is free for other work, and only one chunk is held in memory at a time. The caller
+    deletes the file when done.
+    """
+    fd, path = tempfile.mkstemp(prefix='giveaway-export-', suffix=f'.{fmt}.gz')
+    os.close(fd)
+    loop = asyncio.get_running_loop()
+    count = 0
+    gz = await loop.run_in_executor(_executor, gzip.open, path, 'wb')
+    try:
+        rows = iter(rows)
+        header = True
+        while True:
+            chunk = list(islice(rows, chunk_rows))
+            if chunk or header:
+                data = _format_chunk(chunk, fieldnames, fmt, header)
+                await loop.run_in_executor(_executor, gz.write, data)
+                count += len(chunk)
+                header = False
+            if len(chunk) < chunk_rows:
+                break
+    except BaseException:
+        await loop.run_in_executor(_executor, gz.close)
+        os.unlink(path)
+        raise
+    await loop.run_in_executor(_executor, gz.close)
+    return path, count
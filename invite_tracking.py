@@ -0,0 +1,90 @@
+import asyncio
+
+
+class InviteCoordinator:
+    """Per-guild single-flight invite fetching with batched join attribution.
+
+    Joins are collected per guild for `window` seconds and attributed together from one
+    before/after pair of invite snapshots, so a burst of N joins costs one REST fetch
+    instead of N and no two joins ever diff against the same stale snapshot. Any other
+    caller of fetch() while a fetch for that guild is in flight shares its result.
+    """
+
+    def __init__(self, fetch, attribute, quick_attribute=None, window=1.0):
+        self._fetch = fetch  # async fetch(guild) -> {code: cached_invite}
+        self._attribute = attribute  # attribute(guild, members, fetched_invites) -> members left unattributed
+        self._quick_attribute = quick_attribute  # quick_attribute(guild, members) -> True if handled without a fetch
+        self.window = window
+        self._inflight = {}  # {guild_id: Future}
+        self._pending = {}  # {guild_id: [members]}
+        self._batches = {}  # {guild_id: Task}
+        self.stats = {'joins': 0, 'batches': 0, 'fetches': 0, 'shared_fetches': 0, 'join_fetches': 0, 'unattributed': 0}
+
+    @property
+    def fetches_saved(self):
+        """REST fetches avoided compared to one fetch per join"""
+        return self.stats['joins'] - self.stats['join_fetches']
+
+    async def fetch(self, guild):
+        """Fetch a guild's invites, sharing the request with any concurrent caller"""
+        future = self._inflight.get(guild.id)
+        if future is not None:
+            self.stats['shared_fetches'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[guild.id] = future
+        self.stats['fetches'] += 1
+        try:
+            result = await self._fetch(guild)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so unshared failures aren't logged as unhandled
+            raise
+        finally:
+            del self._inflight[guild.id]
+
+    def member_joined(self, guild, member):
+        """Queue a join for attribution in the guild's current batch"""
+        self.stats['joins'] += 1
+        self._pending.setdefault(guild.id, []).append(member)
+        if guild.id not in self._batches:
+            self._batches[guild.id] = asyncio.create_task(self._run_batch(guild))
+
+    async def _run_batch(self, guild):
+        # The batch stays registered until it's attributed, so joins arriving during its
+        # fetch queue up for it instead of starting a second batch against the same snapshot
+        try:
+            await asyncio.sleep(self.window)
+            members = self._pending.pop(guild.id, [])
+            if members:
+                await self._attribute_batch(guild, members)
+        finally:
+            del self._batches[guild.id]
+
+    async def _attribute_batch(self, guild, members):
+        self.stats['batches'] += 1
+        try:
+            if self._quick_attribute is not None and self._quick_attribute(guild, members):
+                return
+            shared = guild.id in self._inflight
+            fetched = await self.fetch(guild)
+            if not shared:
+                self.stats['join_fetches'] += 1
+            # Joins that arrived during the fetch are counted in its snapshot too, so they
+            # belong to this batch rather than the next one
+            members += self._pending.pop(guild.id, [])
+            unattributed = self._attribute(guild, members, fetched) or 0
+        except Exception as e:
+            self.stats['unattributed'] += len(members)
+            print(f'Failed to attribute joins in {guild.name}, {len(members)} join(s) left unattributed: {e!r}')
+            return
+        self.stats['unattributed'] += unattributed
+        if len(members) > 1 and not unattributed:
+            print(f'Attributed {len(members)} joins in {guild.name} with one invite fetch')
+
+    async def close(self):
+        for task in list(self._batches.values()):
+            task.cancel()
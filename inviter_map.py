@@ -0,0 +1,114 @@
+from array import array
+from bisect import bisect_left
+
+
+class InviterMap:
+    """Compact member -> inviter map for one guild.
+
+    Most entries live in two parallel array('Q') columns sorted by member ID (16 bytes
+    per member instead of a dict slot plus two str objects). Recent changes go to a small
+    dict and a removal set that are merged into the arrays once they grow.
+    """
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self._members = array('Q', (member for member, _ in pairs))
+        self._inviters = array('Q', (inviter for _, inviter in pairs))
+        self._recent = {}  # {member_id: inviter_id} not yet merged
+        self._removed = set()  # member_ids in the arrays that have been removed
+
+    def _find(self, member_id):
+        i = bisect_left(self._members, member_id)
+        if i < len(self._members) and self._members[i] == member_id and member_id not in self._removed:
+            return i
+        return -1
+
+    def get(self, member_id):
+        """Inviter ID for a member, or None"""
+        if member_id in self._recent:
+            return self._recent[member_id]
+        i = self._find(member_id)
+        return self._inviters[i] if i >= 0 else None
+
+    def __contains__(self, member_id):
+        return self.get(member_id) is not None
+
+    def __len__(self):
+        # Members in _recent are never live in the arrays (set() updates those in place)
+        return len(self._members) - len(self._removed) + len(self._recent)
+
+    def set(self, member_id, inviter_id):
+        i = self._find(member_id)
+        if i >= 0:
+            self._inviters[i] = inviter_id
+            return
+        self._recent[member_id] = inviter_id
+        self._maybe_compact()
+
+    def pop(self, member_id):
+        """Remove a member, returning their inviter ID or None"""
+        if member_id in self._recent:
+            return self._recent.pop(member_id)
+        i = self._find(member_id)
+        if i < 0:
+            return None
+        inviter_id = self._inviters[i]
+        self._removed.add(member_id)
+        self._maybe_compact()
+        return inviter_id
+
+    def _maybe_compact(self):
+        if len(self._recent) + len(self._removed) > max(1024, len(self._members) // 8):
+            self.compact()
+
+    def compact(self):
+        """Merge recent changes into the sorted arrays"""
+        pairs = [(m, inv) for m, inv in zip(self._members, self._inviters) if m not in self._removed]
+        pairs.extend(self._recent.items())
+        self.__init__(pairs)
+
+    def items(self):
+        """(member_id, inviter_id) pairs"""
+        for member_id, inviter_id in zip(self._members, self._inviters):
+            if member_id not in self._removed:
+                yield member_id, inviter_id
+        yield from self._recent.items()
+
+    def to_json(self):
+        """{member_id: inviter_id} with string keys, like the rest of the saved data"""
+        return {str(member_id): str(inviter_id) for member_id, inviter_id in self.items()}
+
+
+class InviterTracking:
+    """Who invited whom, per guild: {guild_id: InviterMap}.
+
+    Loaded guilds stay in their saved {member_id: inviter_id} form until first used, so
+    startup only parses the file and guilds that never see a leave are never converted.
+    """
+
+    def __init__(self):
+        self._guilds = {}  # {guild_id: InviterMap}
+        self._raw = {}  # {guild_id: {member_id: inviter_id}} not converted yet
+
+    def load(self, data):
+        self._guilds = {}
+        self._raw = {int(guild_key): guild_tracking for guild_key, guild_tracking in data.items()}
+
+    def guild(self, guild_id):
+        """The InviterMap for a guild (by int ID), converting saved data on first access"""
+        guild_map = self._guilds.get(guild_id)
+        if guild_map is None:
+            raw = self._raw.pop(guild_id, {})
+            guild_map = InviterMap((int(member), int(inviter)) for member, inviter in raw.items())
+            self._guilds[guild_id] = guild_map
+        return guild_map
+
+    def __contains__(self, guild_id):
+        return guild_id in self._guilds or guild_id in self._raw
+
+    def to_json(self):
+        """{guild_id: {member_id: inviter_id}} in the saved format"""
+        data = {str(guild_id): guild_tracking for guild_id, guild_tracking in self._raw.items()}
+        for guild_id, guild_map in self._guilds.items():
+            data[str(guild_id)] = guild_map.to_json()
+        return data
@@ -0,0 +1,100 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+
+class LoopLagMonitor:
+    """Measures event loop lag and reports what was blocking it.
+
+    A task on the loop sleeps for `interval` and records how late it wakes up. A helper
+    thread watches that task's heartbeat. When the loop has been stuck for longer than
+    `threshold`, the thread captures the loop thread's current stack (the code doing the
+    blocking, e.g. a big synchronous save or a long loop in a command) and logs it once
+    per stall. Lag percentiles are logged every `report_interval` seconds.
+    """
+
+    def __init__(self, interval=0.1, threshold=0.25, report_interval=60, on_lag=None, on_stall=None, max_frames=25):
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self.max_frames = max_frames
+        self._on_lag = on_lag  # on_lag(seconds) for every sample
+        self._on_stall = on_stall  # on_stall(seconds, stack_text) when a stall is caught
+        self._samples = []
+        self._beat = time.monotonic()
+        self._beats = 0
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name='loop-lag-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _measure(self):
+        next_report = time.monotonic() + self.report_interval
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self._beat = now
+            self._beats += 1
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self._on_lag is not None:
+                self._on_lag(lag)
+            if now >= next_report:
+                self.report()
+                next_report = now + self.report_interval
+
+    def percentiles(self):
+        """(p50, p99, max) of the lag samples since the last report"""
+        samples = sorted(self._samples)
+        if not samples:
+            return 0.0, 0.0, 0.0
+        return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))], samples[-1]
+
+    def report(self):
+        p50, p99, worst = self.percentiles()
+        print(f'Event loop lag over {len(self._samples)} samples: p50 {p50 * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms, max {worst * 1000:.1f}ms')
+        self._samples = []
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            stalled_for = time.monotonic() - self._beat - self.interval
+            beat = self._beats
+            if stalled_for < self.threshold or beat == reported_beat:
+                continue
+            # One capture per stall: the loop hasn't ticked since we last reported
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame, limit=self.max_frames))
+            self.stalls += 1
+            print(f'Event loop blocked for {stalled_for:.2f}s+, main thread is in:\n{stack}')
+            if self._on_stall is not None:
+                self._on_stall(stalled_for, stack)
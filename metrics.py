@@ -0,0 +1,210 @@
+import asyncio
+import functools
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds; covers sub-millisecond cache hits up to multi-second draws
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and three additions"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """Counters, histograms and gauges, rendered in Prometheus text format.
+
+    Metrics are identified by (name, labels) where labels is a tuple of (key, value)
+    pairs. Gauges are callbacks read only when the metrics are rendered, so they cost
+    nothing in between.
+    """
+
+    def __init__(self, prefix='giveaway_bot'):
+        self.prefix = prefix
+        self.counters = {}  # {(name, labels): value}
+        self.histograms = {}  # {(name, labels): Histogram}
+        self.gauges = {}  # {name: (help, fn() -> number or {labels: number})}
+        self.help = {}
+        self.started_at = time.time()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def gauge(self, name, fn, help=''):
+        """Register a gauge read from fn() at render time"""
+        self.gauges[name] = (help, fn)
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+
+    def timed(self, name, **labels):
+        """Decorator recording a function's duration (sync or async) in a histogram"""
+        def decorator(func):
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(name, **labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def read_gauges(self):
+        """{name: {labels: value}} for every gauge"""
+        values = {}
+        for name, (_, fn) in self.gauges.items():
+            try:
+                value = fn()
+            except Exception as e:
+                print(f'Failed to read gauge {name}: {e}')
+                continue
+            values[name] = value if isinstance(value, dict) else {(): value}
+        return values
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind):
+            full = f'{self.prefix}_{name}'
+            if name in self.help:
+                lines.append(f'# HELP {full} {self.help[name]}')
+            lines.append(f'# TYPE {full} {kind}')
+            return full
+
+        for name in sorted({name for name, _ in self.counters}):
+            full = header(name, 'counter')
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric == name:
+                    lines.append(f'{full}{_labels(labels)} {value}')
+
+        for name in sorted({name for name, _ in self.histograms}):
+            full = header(name, 'histogram')
+            for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{full}_bucket{_labels(labels + (("le", repr(bound)),))} {cumulative}')
+                lines.append(f'{full}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                lines.append(f'{full}_sum{_labels(labels)} {histogram.sum}')
+                lines.append(f'{full}_count{_labels(labels)} {histogram.count}')
+
+        for name, values in sorted(self.read_gauges().items()):
+            help_text = self.gauges[name][0]
+            if help_text:
+                self.help.setdefault(name, help_text)
+            full = header(name, 'gauge')
+            for labels, value in values.items():
+                lines.append(f'{full}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            base = self.name[:-len('_seconds')] if self.name.endswith('_seconds') else self.name
+            self.metrics.inc(f'{base}_errors_total', **self.labels)
+        return False
+
+
+class MetricsServer:
+    """Tiny HTTP server answering GET /metrics with metrics.render()"""
+
+    def __init__(self, metrics, host='127.0.0.1', port=9100):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f'Serving metrics on http://{self.host}:{self.port}/metrics')
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip the headers; nothing in them matters here
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/metrics', '/'):
+                status, body = '200 OK', self.metrics.render().encode()
+            else:
+                status, body = '404 Not Found', b'not found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def snapshot(obj):
+    """Copy the dict/list structure of obj so it can be serialized off the event loop"""
+    if isinstance(obj, dict):
+        return {key: snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        # Lists of plain IDs are the bulk of the data, copy those at C speed
+        if obj and not isinstance(obj[0], (dict, list)):
+            return list(obj)
+        return [snapshot(value) for value in obj]
+    return obj
+
+
+class WriteBehindStore:
+    """Batches saves of the bot's data into one background flush per interval.
+
+    Handlers call mark_dirty() (whole dataset changed) or append() (one journaled record)
+    instead of writing anything. Every `interval` seconds the flush loop snapshots the dirty
+    datasets on the event loop (a cheap structural copy) and hands them, together with the
+    pending journal records, to the storage backend on a dedicated writer thread. Datasets
+    registered with an `encode` function are converted to the saved format on that thread
+    too. Data on disk is therefore never more than roughly one interval plus one write
+    behind memory.
+    """
+
+    def __init__(self, backend, interval=0.25):
+        self.backend = backend
+        self.interval = interval
+        self._datasets = {}  # {name: (snapshot_fn, copy)}
+        self._encoders = {}  # {name: encode_fn} run on the writer thread
+        self._pending = {}  # {name: [journal records]}
+        self._dirty = set()
+        self._dirty_since = None
+        self._task = None
+        self._lock = asyncio.Lock()
+        # A single writer thread keeps backend writes ordered (and sqlite on one connection)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='store-writer')
+        self.stats = {'marks': 0, 'appends': 0, 'flushes': 0, 'writes': 0, 'errors': 0, 'max_staleness': 0.0}
+        self.on_write = None  # Optional on_write(seconds) after each backend write, e.g. for metrics
+
+    def register(self, name, snapshot_fn, journaled=False, copy=True, encode=None):
+        """Register a dataset; snapshot_fn returns the current in-memory object to save.
+
+        Pass copy=False when snapshot_fn already returns a new object that nothing else
+        holds. encode(snapshot), if given, turns it into the saved format on the writer thread.
+        """
+        self._datasets[name] = (snapshot_fn, copy)
+        if encode is not None:
+            self._encoders[name] = encode
+        if journaled:
+            self._pending[name] = []
+
+    def _touch(self):
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+
+    def mark_dirty(self, name):
+        """Schedule a full save of a dataset on the next flush"""
+        self._touch()
+        self._dirty.add(name)
+        self.stats['marks'] += 1
+
+    def append(self, name, record):
+        """Queue one journal record for a journaled dataset"""
+        self._touch()
+        self._pending[name].append(record)
+        self.stats['appends'] += 1
+
+    def has_pending(self):
+        return bool(self._dirty) or any(self._pending.values())
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background flush loop (idempotent)"""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.has_pending():
+                try:
+                    await self.flush()
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f'Background save failed, will retry: {e}')
+
+    def _take_batch(self):
+        """Collect ({name: snapshot}, {name: records}) to write, on the event loop"""
+        names = set(self._dirty)
+        for name, records in self._pending.items():
+            # Let the backend roll a journal into a full snapshot when it has grown too big
+            if records and self.backend.needs_compaction(name, records):
+                names.add(name)
+        self._dirty = set()
+        if self._dirty_since is not None:
+            staleness = time.monotonic() - self._dirty_since
+            self.stats['max_staleness'] = max(self.stats['max_staleness'], staleness)
+            self._dirty_since = None
+
+        snapshots = {}
+        for name in names:
+            snapshot_fn, copy = self._datasets[name]
+            snapshots[name] = snapshot(snapshot_fn()) if copy else snapshot_fn()
+        journals = {}
+        for name, records in self._pending.items():
+            # A snapshot already contains every pending record
+            if records and name not in snapshots:
+                journals[name] = records
+            self._pending[name] = []
+        return snapshots, journals
+
+    def _write(self, snapshots, journals):
+        """Encode the snapshots that need it and write the batch (runs on the writer thread)"""
+        for name, encode in self._encoders.items():
+            if name in snapshots:
+                snapshots[name] = encode(snapshots[name])
+        self.backend.write(snapshots, journals)
+
+    async def flush(self):
+        """Write everything pending now, off the event loop"""
+        async with self._lock:
+            snapshots, journals = self._take_batch()
+            if not snapshots and not journals:
+                return
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(self._executor, self._write, snapshots, journals)
+            except BaseException:
+                # Retry with full snapshots, which cover any journal records that were lost
+                for name in list(snapshots) + list(journals):
+                    self.mark_dirty(name)
+                raise
+            self.stats['flushes'] += 1
+            self.stats['writes'] += len(snapshots) + len(journals)
+            if self.on_write is not None:
+                self.on_write(time.perf_counter() - started)
+
+    async def stop(self):
+        """Stop the flush loop and force a final flush"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def flush_sync(self):
+        """Blocking flush for use when no event loop is running (e.g. at interpreter exit)"""
+        snapshots, journals = self._take_batch()
+        if snapshots or journals:
+            self._write(snapshots, journals)
+            self.stats['flushes'] += 1
+            self.stats['writes'] += len(snapshots) + len(journals)
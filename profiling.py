@@ -0,0 +1,148 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from array import array
+from collections import Counter
+
+
+async def run_cprofile(seconds, limit=40):
+    """Profile everything the event loop runs for `seconds`; returns a pstats report"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs()
+    out.write(f'== Top {limit} functions by cumulative time ==\n')
+    stats.sort_stats('cumulative').print_stats(limit)
+    out.write(f'\n== Top {limit} functions by own time ==\n')
+    stats.sort_stats('tottime').print_stats(limit)
+    return out.getvalue()
+
+
+async def run_sampling(seconds, interval=0.005, limit=40):
+    """Sample the event loop thread's stack every `interval` from a helper thread.
+
+    Much lower overhead than cProfile, so it is safe during a busy giveaway. Reports
+    the functions seen most often at the top of the stack (own time), anywhere on the
+    stack (inclusive time) and the most common whole stacks.
+    """
+    loop_thread = threading.get_ident()
+    done = threading.Event()
+    own = Counter()
+    inclusive = Counter()
+    stacks = Counter()
+    samples = 0
+
+    def sample():
+        nonlocal samples
+        while not done.wait(interval):
+            frame = sys._current_frames().get(loop_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if not stack:
+                continue
+            samples += 1
+            own[stack[0]] += 1
+            for name in set(stack):
+                inclusive[name] += 1
+            stacks[';'.join(reversed(stack))] += 1
+
+    thread = threading.Thread(target=sample, name='sampling-profiler', daemon=True)
+    thread.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        done.set()
+        await asyncio.get_running_loop().run_in_executor(None, thread.join)
+
+    out = io.StringIO()
+    out.write(f'{samples} samples every {interval * 1000:.0f}ms over {seconds}s\n')
+    out.write('Time in select() is the loop waiting for events (idle), not work\n')
+    for title, counter in (('own time (top of stack)', own), ('inclusive time (anywhere on stack)', inclusive)):
+        out.write(f'\n== Top {limit} functions by {title} ==\n')
+        for name, count in counter.most_common(limit):
+            out.write(f'{count / max(samples, 1) * 100:6.1f}%  {count:7d}  {name}\n')
+    out.write('\n== Most common stacks (collapsed, flamegraph.pl compatible) ==\n')
+    for stack, count in stacks.most_common(limit):
+        out.write(f'{stack} {count}\n')
+    return out.getvalue()
+
+
+def start_tracemalloc(frames=10):
+    """Start tracing allocations unless already tracing; returns True if we started it"""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
+
+
+def tracemalloc_report(started_here, limit=30):
+    """Top allocation sites since tracing started"""
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    if started_here:
+        tracemalloc.stop()
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    out = io.StringIO()
+    out.write(f'Traced memory: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB\n')
+    out.write(f'\n== Top {limit} allocation sites ==\n')
+    for stat in snapshot.statistics('lineno')[:limit]:
+        out.write(f'{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {stat.traceback}\n')
+    return out.getvalue()
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate memory held by obj and everything it references (shared objects counted once)"""
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, (str, bytes, int, float, bool, array, type, types.ModuleType, types.FunctionType)) or obj is None:
+            continue  # No references worth following (code and classes aren't data)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                slots = getattr(cls, '__slots__', ())
+                for slot in (slots,) if isinstance(slots, str) else slots:
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+    return size
+
+
+def size_report(named_objects):
+    """Deep size, in MiB, of each named object"""
+    out = io.StringIO()
+    out.write('== Data structure sizes (deep, approximate) ==\n')
+    started = time.perf_counter()
+    for name, obj in named_objects.items():
+        out.write(f'{deep_sizeof(obj) / 1024 / 1024:10.2f} MiB  {name}\n')
+    out.write(f'(measured in {time.perf_counter() - started:.2f}s)\n')
+    return out.getvalue()
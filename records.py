@@ -0,0 +1,157 @@
+"""Typed in-memory records for the bot's saved data.
+
+In memory, guilds and users are keyed by int ID and records are __slots__ dataclasses
+instead of free-form dicts, which saves the per-key string and per-record dict on every
+user. The saved format is unchanged: load_*() convert from it and *_to_json() back to it,
+so the storage backends only ever see the original JSON shapes.
+"""
+from dataclasses import dataclass
+
+
+def _int_or_none(value):
+    return int(value) if value is not None else None
+
+
+def _str_or_none(value):
+    return str(value) if value is not None else None
+
+
+@dataclass
+class InviteRecord:
+    """A user's invite credits and manual bonus tickets in one guild"""
+    __slots__ = ('invites', 'manual_bonus')
+    invites: int
+    manual_bonus: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data.get('invites', 0), data.get('manual_bonus', 0))
+
+    def to_json(self):
+        data = {'invites': self.invites}
+        if self.manual_bonus:
+            data['manual_bonus'] = self.manual_bonus
+        return data
+
+
+@dataclass
+class Giveaway:
+    """One giveaway.
+
+    IDs are ints here and strings in the saved format. Keys this version doesn't know
+    about are kept in `extra` so they survive a load/save round trip.
+    """
+    __slots__ = (
+        'active', 'prize', 'created_at', 'created_by', 'channel_id', 'duration_hours', 'end_time',
+        'winners', 'prize_distribution', 'message_id', 'winners_list', 'ended_at', 'total_entries', 'archived_at', 'extra',
+    )
+    active: bool
+    prize: str
+    created_at: str
+    created_by: int
+    channel_id: int
+    duration_hours: int
+    end_time: str
+    winners: int
+    prize_distribution: list
+    message_id: int
+    winners_list: list
+    ended_at: str
+    total_entries: int
+    archived_at: str  # Set once the entries have moved to the cold archive (archive.py)
+    extra: dict
+
+    @classmethod
+    def create(cls, prize, created_at, created_by, channel_id, duration_hours, end_time, winners, prize_distribution):
+        """A new, active giveaway that hasn't been posted yet"""
+        return cls(
+            True, prize, created_at, created_by, channel_id, duration_hours, end_time,
+            winners, prize_distribution, None, None, None, None, None, None,
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        extra = {key: value for key, value in data.items() if key not in cls.__slots__}
+        winners_list = data.get('winners_list')
+        return cls(
+            bool(data.get('active', False)),
+            data.get('prize', ''),
+            data.get('created_at'),
+            _int_or_none(data.get('created_by')),
+            _int_or_none(data.get('channel_id')),
+            data.get('duration_hours'),
+            data.get('end_time'),
+            data.get('winners', 1),
+            data.get('prize_distribution'),
+            _int_or_none(data.get('message_id')),
+            [int(user_id) for user_id in winners_list] if winners_list is not None else None,
+            data.get('ended_at'),
+            data.get('total_entries'),
+            data.get('archived_at'),
+            extra or None,
+        )
+
+    def to_json(self):
+        data = {
+            'active': self.active,
+            'prize': self.prize,
+            'created_at': self.created_at,
+            'created_by': _str_or_none(self.created_by),
+            'channel_id': _str_or_none(self.channel_id),
+            'duration_hours': self.duration_hours,
+            'end_time': self.end_time,
+            'winners': self.winners,
+            'prize_distribution': self.prize_distribution,
+        }
+        if self.message_id is not None:
+            data['message_id'] = str(self.message_id)
+        if self.winners_list is not None:
+            data['winners_list'] = [str(user_id) for user_id in self.winners_list]
+        if self.ended_at is not None:
+            data['ended_at'] = self.ended_at
+        if self.total_entries is not None:
+            data['total_entries'] = self.total_entries
+        if self.archived_at is not None:
+            data['archived_at'] = self.archived_at
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+def load_invites(data):
+    """{guild_id: {user_id: {...}}} -> {int guild_id: {int user_id: InviteRecord}}"""
+    return {
+        int(guild_key): {int(user_key): InviteRecord.from_json(record) for user_key, record in guild_invites.items()}
+        for guild_key, guild_invites in data.items()
+        if isinstance(guild_invites, dict)
+    }
+
+
+def invites_to_json(invite_data):
+    return {
+        str(guild_id): {str(user_id): record.to_json() for user_id, record in guild_invites.items()}
+        for guild_id, guild_invites in invite_data.items()
+    }
+
+
+def load_giveaways(data):
+    """{guild_id: {giveaway_id: {...}}} -> {int guild_id: {giveaway_id: Giveaway}}
+
+    Non-dict values (the old per-guild {'active': False} marker) are dropped.
+    """
+    return {
+        int(guild_key): {
+            giveaway_id: Giveaway.from_json(giveaway)
+            for giveaway_id, giveaway in guild_giveaways.items()
+            if isinstance(giveaway, dict)
+        }
+        for guild_key, guild_giveaways in data.items()
+        if isinstance(guild_giveaways, dict)
+    }
+
+
+def giveaways_to_json(giveaway_data):
+    return {
+        str(guild_id): {giveaway_id: giveaway.to_json() for giveaway_id, giveaway in guild_giveaways.items()}
+        for guild_id, guild_giveaways in giveaway_data.items()
+    }
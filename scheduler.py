@@ -0,0 +1,100 @@
+import asyncio
+import heapq
+import time
+
+
+class GiveawayScheduler:
+    """Ends giveaways on time from one loop instead of one sleeping task per giveaway.
+
+    Timers live in a min-heap of (end_timestamp, guild_id, giveaway_id). Cancelling or
+    rescheduling only updates the `_deadlines` map; stale heap entries are skipped when
+    they reach the top. Overdue giveaways fire immediately, at most `max_concurrency` at
+    a time, so a restart after a long outage doesn't end everything at once.
+    """
+
+    def __init__(self, fire, max_concurrency=4):
+        self._fire = fire  # async fire(guild_id, giveaway_id)
+        self._heap = []
+        self._deadlines = {}  # {(guild_id, giveaway_id): end_timestamp}
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._task = None
+        self._firing = set()
+        self.fired = 0
+
+    @property
+    def pending(self):
+        """Number of giveaways waiting to end"""
+        return len(self._deadlines)
+
+    def schedule(self, guild_id, giveaway_id, end_timestamp):
+        """Schedule (or reschedule) a giveaway to end at a unix timestamp"""
+        key = (guild_id, giveaway_id)
+        if self._deadlines.get(key) == end_timestamp:
+            return
+        self._deadlines[key] = end_timestamp
+        heapq.heappush(self._heap, (end_timestamp, guild_id, giveaway_id))
+        # Drop cancelled/rescheduled entries once they make up most of the heap
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(ts, g, gid) for (g, gid), ts in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def cancel(self, guild_id, giveaway_id):
+        """Forget a giveaway's timer; returns False if it wasn't scheduled"""
+        return self._deadlines.pop((guild_id, giveaway_id), None) is not None
+
+    def start(self):
+        """Start the scheduler loop (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _discard_stale(self):
+        while self._heap:
+            end_timestamp, guild_id, giveaway_id = self._heap[0]
+            if self._deadlines.get((guild_id, giveaway_id)) == end_timestamp:
+                return
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._discard_stale()
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            end_timestamp, guild_id, giveaway_id = self._heap[0]
+            delay = end_timestamp - time.time()
+            if delay > 0:
+                # Sleep until the next deadline, or until an earlier one is scheduled
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._deadlines[(guild_id, giveaway_id)]
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._fire_one(guild_id, giveaway_id))
+            self._firing.add(task)
+            task.add_done_callback(self._firing.discard)
+
+    async def _fire_one(self, guild_id, giveaway_id):
+        try:
+            await self._fire(guild_id, giveaway_id)
+            self.fired += 1
+        except Exception as e:
+            print(f'Failed to end giveaway {giveaway_id} in guild {guild_id}: {e}')
+        finally:
+            self._semaphore.release()
@@ -0,0 +1,116 @@
+import asyncio
+import math
+import os
+import time
+
+import storage
+
+
+def parse_shard_ids(value):
+    """Parse "0-3,8" into [0, 1, 2, 3, 8]; empty means no explicit shard list"""
+    shard_ids = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(shard_ids))
+
+
+def shard_for_guild(guild_id, shard_count):
+    """The shard Discord routes a guild's events to"""
+    return (int(guild_id) >> 22) % shard_count
+
+
+def split_shards(shard_count, processes):
+    """Contiguous shard ranges, as even as possible, one per process"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+def status_dir(data_dir):
+    return os.path.join(data_dir, 'cluster')
+
+
+class ShardMonitor:
+    """Gateway events/sec per shard, from the change in each shard's sequence number.
+
+    Every `interval` seconds the rates are recomputed and, when `status_path` is set
+    (cluster mode), written there for cluster.py to report.
+    """
+
+    def __init__(self, client, interval=10, status_path=None, cluster_id=None):
+        self.client = client
+        self.interval = interval
+        self.status_path = status_path
+        self.cluster_id = cluster_id
+        self.rates = {}  # {shard_id: events per second}
+        self._last = {}  # {shard_id: (monotonic, sequence)}
+        self._task = None
+
+    def _sequences(self):
+        shards = getattr(self.client, 'shards', None)
+        if shards:
+            # AutoShardedBot: one websocket per shard
+            return {shard_id: getattr(getattr(info._parent, 'ws', None), 'sequence', None) for shard_id, info in shards.items()}
+        ws = getattr(self.client, 'ws', None)
+        return {self.client.shard_id or 0: getattr(ws, 'sequence', None)}
+
+    def sample(self):
+        now = time.monotonic()
+        for shard_id, sequence in self._sequences().items():
+            if sequence is None:
+                continue
+            last = self._last.get(shard_id)
+            if last is not None and now > last[0]:
+                # A new session starts counting from 1 again
+                delta = sequence - last[1] if sequence >= last[1] else sequence
+                self.rates[shard_id] = delta / (now - last[0])
+            self._last[shard_id] = (now, sequence)
+
+    def status(self):
+        guilds = {}
+        for guild in self.client.guilds:
+            guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+        latencies = dict(getattr(self.client, 'latencies', None) or [(self.client.shard_id or 0, self.client.latency)])
+        shards = {}
+        for shard_id in sorted(set(self._last) | set(latencies)):
+            latency = latencies.get(shard_id)
+            shards[str(shard_id)] = {
+                'events_per_sec': round(self.rates.get(shard_id, 0.0), 2),
+                'latency_ms': round(latency * 1000) if latency is not None and not math.isnan(latency) else None,
+                'guilds': guilds.get(shard_id, 0),
+            }
+        return {'cluster': self.cluster_id, 'pid': os.getpid(), 'updated_at': time.time(), 'shards': shards}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sample()
+                if self.status_path is not None:
+                    status = self.status()
+                    await asyncio.get_running_loop().run_in_executor(None, storage.atomic_write_json, self.status_path, status)
+            except Exception as e:
+                print(f'Failed to update shard stats: {e}')
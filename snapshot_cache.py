@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+
+
+class SnapshotCache:
+    """Short-lived LRU cache of rendered giveaway snapshots (leaderboard pages, status).
+
+    Keys are (guild_id, giveaway_id, page). Entries expire after `ttl` seconds, are
+    dropped as soon as anything about their giveaway changes, and the least recently
+    used entry across all guilds is evicted once there are more than `max_entries`.
+    """
+
+    def __init__(self, ttl=30, max_entries=512, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # {(guild_id, giveaway_id, page): (expires_at, value)}
+        self._by_giveaway = {}  # {(guild_id, giveaway_id): {page}}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, guild_id, giveaway_id, page):
+        """The cached value, or None if missing or expired"""
+        key = (guild_id, giveaway_id, page)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                self._discard(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, guild_id, giveaway_id, page, value):
+        key = (guild_id, giveaway_id, page)
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        self._by_giveaway.setdefault((guild_id, giveaway_id), set()).add(page)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _discard(self, key):
+        del self._entries[key]
+        giveaway_key = key[:2]
+        pages = self._by_giveaway.get(giveaway_key)
+        if pages is not None:
+            pages.discard(key[2])
+            if not pages:
+                del self._by_giveaway[giveaway_key]
+
+    def invalidate(self, guild_id, giveaway_id):
+        """Drop every cached page of one giveaway"""
+        for page in self._by_giveaway.pop((guild_id, giveaway_id), ()):
+            del self._entries[(guild_id, giveaway_id, page)]
+
+    def invalidate_guild(self, guild_id):
+        for giveaway_key in [key for key in self._by_giveaway if key[0] == guild_id]:
+            self.invalidate(*giveaway_key)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_giveaway.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,447 @@
+"""Storage backends for the giveaway bot's persistent data.
+
+Both backends load the bot's datasets as plain dicts and receive batched writes
+from persistence.WriteBehindStore on its writer thread:
+
+- JsonBackend keeps the original invite_data.json / giveaway_data.json /
+  entries_data.json files (plus inviter_tracking.json), with append-only journals for
+  new entries and inviter tracking changes.
+- SqliteBackend keeps everything in one WAL-mode sqlite database, so individual
+  entries and invite counts are written as rows instead of whole files.
+  Given a guild_filter it only loads and writes the guilds it accepts, which lets the
+  processes of a sharded cluster share one database, each owning its own partition.
+
+Run `python storage.py migrate [data_dir]` to copy existing JSON files into sqlite.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+
+def atomic_write_json(path, data, indent=4):
+    """Write data to path via a temp file + rename so a crash never leaves a truncated file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_journal(path):
+    """Yield the records of an append-only JSON-lines journal, skipping a torn last line"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A crash mid-append can leave a partial final line
+                print(f'Skipping corrupt journal line in {path}')
+
+
+def append_journal(path, records):
+    """Append records as JSON lines and make them durable; returns the bytes written"""
+    data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+    with open(path, 'a') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(data)
+
+
+def normalize_entries(loaded_entries):
+    """Convert loaded entries to {guild_id: {giveaway_id: [user_ids]}}, dropping the legacy list format"""
+    entries = {}
+    for guild_key, value in loaded_entries.items():
+        if isinstance(value, list):
+            # Old format: {guild_id: [user_ids]} - skip it, start fresh
+            print(f'Detected old entries format for guild {guild_key}, resetting...')
+            entries[guild_key] = {}
+        elif isinstance(value, dict):
+            # New format: {guild_id: {giveaway_id: [user_ids]}}
+            entries[guild_key] = value
+        else:
+            entries[guild_key] = {}
+    return entries
+
+
+class JsonBackend:
+    """The original JSON files, with new entries journaled instead of rewriting the snapshot"""
+
+    def __init__(self, data_dir, compact_bytes=1024 * 1024):
+        self.paths = {
+            'invites': os.path.join(data_dir, 'invite_data.json'),
+            'giveaways': os.path.join(data_dir, 'giveaway_data.json'),
+            'entries': os.path.join(data_dir, 'entries_data.json'),
+            'tracking': os.path.join(data_dir, 'inviter_tracking.json'),
+        }
+        self.journal_paths = {
+            'entries': os.path.join(data_dir, 'entries_journal.ndjson'),
+            'tracking': os.path.join(data_dir, 'inviter_tracking_journal.ndjson'),
+        }
+        self.compact_bytes = compact_bytes
+        self.journal_sizes = {
+            name: os.path.getsize(path) if os.path.exists(path) else 0
+            for name, path in self.journal_paths.items()
+        }
+        self.compactions = 0
+
+    def _load_file(self, name):
+        path = self.paths[name]
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            try:
+                return json.load(f)
+            except (json.JSONDecodeError, ValueError):
+                print(f'Error loading {os.path.basename(path)}, starting fresh...')
+                return {}
+
+    def load(self):
+        """Load {'invites', 'giveaways', 'entries', 'tracking'} from the JSON files"""
+        invite_data = self._load_file('invites')
+        giveaway_data = self._load_file('giveaways')
+        entries_data = normalize_entries(self._load_file('entries'))
+
+        # Replay entries made since the last snapshot
+        replayed = 0
+        seen = {}
+        for record in read_journal(self.journal_paths['entries']):
+            giveaway_entries = entries_data.setdefault(record['guild'], {}).setdefault(record['giveaway'], [])
+            key = (record['guild'], record['giveaway'])
+            if key not in seen:
+                seen[key] = set(giveaway_entries)
+            if record['user'] not in seen[key]:
+                seen[key].add(record['user'])
+                giveaway_entries.append(record['user'])
+                replayed += 1
+        if replayed:
+            print(f'Replayed {replayed} entries from the entries journal')
+
+        # Replay inviter tracking changes ({'inviter': None} means the member left)
+        tracking_data = self._load_file('tracking')
+        for record in read_journal(self.journal_paths['tracking']):
+            guild_tracking = tracking_data.setdefault(record['guild'], {})
+            if record['inviter'] is None:
+                guild_tracking.pop(record['member'], None)
+            else:
+                guild_tracking[record['member']] = record['inviter']
+
+        return {'invites': invite_data, 'giveaways': giveaway_data, 'entries': entries_data, 'tracking': tracking_data}
+
+    def needs_compaction(self, name, pending_records):
+        """Roll the journal into a snapshot once it passes the size threshold"""
+        # Estimate the pending size instead of encoding on the event loop
+        return self.journal_sizes.get(name, 0) + 80 * len(pending_records) > self.compact_bytes
+
+    def write(self, snapshots, journals):
+        """Write full snapshots and journal records (runs on the writer thread)"""
+        for name, records in journals.items():
+            self.journal_sizes[name] += append_journal(self.journal_paths[name], records)
+        for name, data in snapshots.items():
+            atomic_write_json(self.paths[name], data)
+            if name in self.journal_paths:
+                # Snapshot is durable, so the journal it absorbed can go
+                open(self.journal_paths[name], 'w').close()
+                self.journal_sizes[name] = 0
+                self.compactions += 1
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS giveaways (
+    guild_id TEXT NOT NULL,
+    giveaway_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, giveaway_id)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id TEXT NOT NULL,
+    giveaway_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    ts REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS entries_key ON entries (guild_id, giveaway_id, user_id);
+CREATE TABLE IF NOT EXISTS invites (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    invites INTEGER NOT NULL DEFAULT 0,
+    manual_bonus INTEGER,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS inviter_tracking (
+    guild_id TEXT NOT NULL,
+    member_id INTEGER NOT NULL,
+    inviter_id INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, member_id)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteBackend:
+    """One WAL-mode sqlite database with giveaway, entry, invite and inviter tables.
+
+    The database is only read by load(); the bot answers lookups from its in-memory data.
+    Writes are diffed against what was last written so each flush only touches the
+    rows that changed, and journaled entries become single-row inserts. The connection
+    is only used from the store's writer thread (and at load time, before it starts).
+
+    With a guild_filter(guild_id) -> bool only the accepted guilds are loaded. Writes are
+    diffs against that loaded state, so they never touch another process's guilds.
+    """
+
+    def __init__(self, db_path, data_dir=None, guild_filter=None):
+        self.db_path = db_path
+        self.data_dir = data_dir  # Where to look for JSON files to migrate on first start
+        self.guild_filter = guild_filter
+        # Other cluster processes may hold the write lock briefly, wait for it instead of failing
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._written = {'invites': {}, 'giveaways': {}, 'entries': {}}  # Last written state, to diff snapshots against
+
+    def _get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def ensure_schema(self):
+        """Migrate JSON files from data_dir the first time the database is used"""
+        if self._get_meta('schema_version') is None:
+            if self.data_dir is not None and any(
+                os.path.exists(path) for path in JsonBackend(self.data_dir).paths.values()
+            ):
+                migrate_json_to_sqlite(self.data_dir, self)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', '1')")
+
+    def _owned_guilds(self):
+        guild_ids = [row[0] for row in self.conn.execute(
+            'SELECT guild_id FROM giveaways UNION SELECT guild_id FROM entries '
+            'UNION SELECT guild_id FROM invites UNION SELECT guild_id FROM inviter_tracking'
+        )]
+        return [guild_id for guild_id in guild_ids if self.guild_filter(guild_id)]
+
+    def _select(self, columns, table, order=''):
+        """Rows of a table, limited to this process's guilds when partitioned"""
+        if self.guild_filter is None:
+            return self.conn.execute(f'SELECT {columns} FROM {table}{order}')
+        return (
+            row
+            for guild_id in self._owned_guilds()
+            for row in self.conn.execute(f'SELECT {columns} FROM {table} WHERE guild_id = ?{order}', (guild_id,))
+        )
+
+    def load(self):
+        """Load {'invites', 'giveaways', 'entries', 'tracking'} from the database, migrating JSON files once"""
+        self.ensure_schema()
+
+        giveaway_data = {}
+        for guild_id, giveaway_id, data in self._select('guild_id, giveaway_id, data', 'giveaways'):
+            giveaway_data.setdefault(guild_id, {})[giveaway_id] = json.loads(data)
+
+        entries_data = {}
+        for guild_id, giveaway_id, user_id in self._select('guild_id, giveaway_id, user_id', 'entries', ' ORDER BY seq'):
+            entries_data.setdefault(guild_id, {}).setdefault(giveaway_id, []).append(user_id)
+        # Keep empty giveaways so the in-memory shape matches the JSON backend
+        for guild_id, guild_giveaways in giveaway_data.items():
+            for giveaway_id in guild_giveaways:
+                entries_data.setdefault(guild_id, {}).setdefault(giveaway_id, [])
+
+        invite_data = {}
+        for guild_id, user_id, invites, manual_bonus in self._select('guild_id, user_id, invites, manual_bonus', 'invites'):
+            record = {'invites': invites}
+            if manual_bonus is not None:
+                record['manual_bonus'] = manual_bonus
+            invite_data.setdefault(guild_id, {})[user_id] = record
+
+        tracking_data = {}
+        for guild_id, member_id, inviter_id in self._select('guild_id, member_id, inviter_id', 'inviter_tracking'):
+            tracking_data.setdefault(guild_id, {})[str(member_id)] = str(inviter_id)
+
+        data = {'invites': invite_data, 'giveaways': giveaway_data, 'entries': entries_data}
+        self._written = {name: _copy(value) for name, value in data.items()}
+        data['tracking'] = tracking_data
+        return data
+
+    def needs_compaction(self, name, pending_records):
+        return False  # Journal records are row inserts, there is nothing to roll up
+
+    def write(self, snapshots, journals):
+        """Apply snapshots as row diffs and journal records as inserts (runs on the writer thread)"""
+        with self.conn:
+            if 'giveaways' in snapshots:
+                self._write_giveaways(snapshots['giveaways'])
+            if 'invites' in snapshots:
+                self._write_invites(snapshots['invites'])
+            if 'entries' in snapshots:
+                self._write_entries(snapshots['entries'])
+            if 'tracking' in snapshots:
+                self._write_tracking(snapshots['tracking'])
+            for record in journals.get('tracking', ()):
+                if record['inviter'] is None:
+                    self.conn.execute(
+                        'DELETE FROM inviter_tracking WHERE guild_id = ? AND member_id = ?',
+                        (record['guild'], int(record['member']))
+                    )
+                else:
+                    self.conn.execute(
+                        'INSERT OR REPLACE INTO inviter_tracking VALUES (?, ?, ?)',
+                        (record['guild'], int(record['member']), int(record['inviter']))
+                    )
+            for record in journals.get('entries', ()):
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO entries (guild_id, giveaway_id, user_id, ts) VALUES (?, ?, ?, ?)',
+                    (record['guild'], record['giveaway'], record['user'], record.get('ts'))
+                )
+                written = self._written['entries'].get(record['guild'], {}).get(record['giveaway'])
+                if written is not None:
+                    written.append(record['user'])
+
+    def _write_giveaways(self, giveaway_data):
+        old = self._written['giveaways']
+        for guild_id, guild_giveaways in giveaway_data.items():
+            if not isinstance(guild_giveaways, dict):
+                continue
+            old_guild = old.get(guild_id, {})
+            for giveaway_id, giveaway in guild_giveaways.items():
+                if not isinstance(giveaway, dict) or old_guild.get(giveaway_id) == giveaway:
+                    continue
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO giveaways VALUES (?, ?, ?)',
+                    (guild_id, giveaway_id, json.dumps(giveaway))
+                )
+            for giveaway_id in old_guild:
+                if giveaway_id not in guild_giveaways:
+                    self.conn.execute('DELETE FROM giveaways WHERE guild_id = ? AND giveaway_id = ?', (guild_id, giveaway_id))
+        for guild_id in old:
+            if guild_id not in giveaway_data:
+                self.conn.execute('DELETE FROM giveaways WHERE guild_id = ?', (guild_id,))
+        self._written['giveaways'] = giveaway_data
+
+    def _write_invites(self, invite_data):
+        old = self._written['invites']
+        for guild_id, guild_invites in invite_data.items():
+            old_guild = old.get(guild_id, {})
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO invites VALUES (?, ?, ?, ?)',
+                [
+                    (guild_id, user_id, record.get('invites', 0), record.get('manual_bonus'))
+                    for user_id, record in guild_invites.items()
+                    if old_guild.get(user_id) != record
+                ]
+            )
+            self.conn.executemany(
+                'DELETE FROM invites WHERE guild_id = ? AND user_id = ?',
+                [(guild_id, user_id) for user_id in old_guild if user_id not in guild_invites]
+            )
+        for guild_id in old:
+            if guild_id not in invite_data:
+                self.conn.execute('DELETE FROM invites WHERE guild_id = ?', (guild_id,))
+        self._written['invites'] = invite_data
+
+    def _write_entries(self, entries_data):
+        old = self._written['entries']
+        for guild_id, guild_entries in entries_data.items():
+            if not isinstance(guild_entries, dict):
+                guild_entries = {}
+            old_guild = old.get(guild_id, {})
+            for giveaway_id, users in guild_entries.items():
+                if old_guild.get(giveaway_id) == users:
+                    continue
+                self.conn.execute('DELETE FROM entries WHERE guild_id = ? AND giveaway_id = ?', (guild_id, giveaway_id))
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO entries (guild_id, giveaway_id, user_id) VALUES (?, ?, ?)',
+                    [(guild_id, giveaway_id, user_id) for user_id in users]
+                )
+            for giveaway_id in old_guild:
+                if giveaway_id not in guild_entries:
+                    self.conn.execute('DELETE FROM entries WHERE guild_id = ? AND giveaway_id = ?', (guild_id, giveaway_id))
+        for guild_id in old:
+            if guild_id not in entries_data:
+                self.conn.execute('DELETE FROM entries WHERE guild_id = ?', (guild_id,))
+        self._written['entries'] = {
+            guild_id: guild_entries if isinstance(guild_entries, dict) else {}
+            for guild_id, guild_entries in entries_data.items()
+        }
+
+    def _write_tracking(self, tracking_data):
+        # Only written as a whole on migration, day to day changes arrive as journal records
+        self.conn.executemany('DELETE FROM inviter_tracking WHERE guild_id = ?', [(guild_id,) for guild_id in tracking_data])
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO inviter_tracking VALUES (?, ?, ?)',
+            [
+                (guild_id, int(member_id), int(inviter_id))
+                for guild_id, guild_tracking in tracking_data.items()
+                for member_id, inviter_id in guild_tracking.items()
+            ]
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+def _copy(obj):
+    if isinstance(obj, dict):
+        return {key: _copy(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return list(obj)
+    return obj
+
+
+def migrate_json_to_sqlite(data_dir, backend):
+    """One-shot copy of the JSON files in data_dir into a sqlite backend"""
+    data = JsonBackend(data_dir).load()
+    backend.write(data, {})
+    # Counted from the database: duplicate entrants in old files are only stored once
+    counts = tuple(
+        backend.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        for table in ('giveaways', 'entries', 'invites')
+    )
+    print(f'Migrated {counts[0]} giveaways, {counts[1]} entries and {counts[2]} invite records to sqlite')
+    return counts
+
+
+def create_backend(kind, data_dir, compact_bytes=1024 * 1024, guild_filter=None):
+    """Build the backend selected by STORAGE_BACKEND ('json' or 'sqlite')"""
+    if kind == 'sqlite':
+        return SqliteBackend(os.path.join(data_dir, 'giveaway_bot.db'), data_dir=data_dir, guild_filter=guild_filter)
+    if guild_filter is not None:
+        raise ValueError('Partitioned (cluster) mode needs STORAGE_BACKEND=sqlite; JSON files can only have one writer')
+    if kind == 'json':
+        return JsonBackend(data_dir, compact_bytes=compact_bytes)
+    raise ValueError(f'Unknown storage backend: {kind}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print('Usage: python storage.py migrate [data_dir]')
+        sys.exit(1)
+    directory = sys.argv[2] if len(sys.argv) > 2 else ('/app/data' if os.path.exists('/app/data') else '.')
+    sqlite_backend = SqliteBackend(os.path.join(directory, 'giveaway_bot.db'))
+    migrate_json_to_sqlite(directory, sqlite_backend)
+    with sqlite_backend.conn:
+        sqlite_backend.conn.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', '1')")
+    sqlite_backend.close()
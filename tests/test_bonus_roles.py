@@ -0,0 +1,41 @@
+"""BonusRoleIndex: each configured role name counts once per member."""
+from types import SimpleNamespace
+
+from bonus_roles import BonusRoleIndex
+
+
+def make_guild():
+    guild = SimpleNamespace(id=1)
+    first = SimpleNamespace(id=10, guild=guild)
+    second = SimpleNamespace(id=11, guild=guild)
+    guild.roles = [
+        SimpleNamespace(id=100, name='+EV', members=[first, second], guild=guild),
+        SimpleNamespace(id=101, name='+EV', members=[first], guild=guild),  # Same name, second role
+        SimpleNamespace(id=102, name='Booster', members=[first], guild=guild),
+    ]
+    return guild, first, second
+
+
+def test_duplicate_role_names_count_once():
+    guild, first, second = make_guild()
+    index = BonusRoleIndex({'+EV': 1, 'Booster': 2})
+    index.resolve(guild)
+    assert index.role_bonus(1, first.id) == 3
+    assert index.role_bonus(1, second.id) == 1
+
+
+def test_member_updates_count_names_once():
+    guild, first, _ = make_guild()
+    index = BonusRoleIndex({'+EV': 1, 'Booster': 2})
+    index.resolve(guild)
+
+    first.roles = [guild.roles[1]]
+    assert index.member_updated(first)
+    assert index.role_bonus(1, first.id) == 1
+
+    first.roles = guild.roles[:2]
+    assert not index.member_updated(first)  # Still one +EV
+
+    first.roles = []
+    assert index.member_updated(first)
+    assert index.role_bonus(1, first.id) == 0
@@ -0,0 +1,113 @@
+"""draw_winners against the expanded ticket pool draw it replaced.
+
+The old draw put each user in a list once per ticket, picked with random.choice and
+removed every ticket of the winner before the next pick. Both are checked against the
+exact probabilities of that process with a chi-square test on seeded RNGs.
+"""
+import itertools
+import math
+import random
+from collections import Counter
+
+from draw import draw_winners
+
+WEIGHTS = [(101, 1), (102, 2), (103, 3), (104, 5), (105, 1), (106, 0)]
+TRIALS = 20000
+
+
+def expanded_pool_draw(weighted_entries, num_winners, rng):
+    """The draw before draw.py: one list slot per ticket, winners removed as they're picked"""
+    pool = []
+    for user_id, tickets in weighted_entries:
+        pool.extend([user_id] * max(tickets, 0))
+    winners = []
+    for _ in range(min(num_winners, len(set(pool)))):
+        winner = rng.choice(pool)
+        winners.append(winner)
+        pool = [user_id for user_id in pool if user_id != winner]
+    return winners
+
+
+def exact_probabilities(weighted_entries, num_winners):
+    """{ordered winner tuple: probability} of drawing tickets one at a time without replacement"""
+    weights = {user_id: tickets for user_id, tickets in weighted_entries if tickets > 0}
+    probabilities = {}
+    for order in itertools.permutations(weights, min(num_winners, len(weights))):
+        remaining = sum(weights.values())
+        p = 1.0
+        for user_id in order:
+            p *= weights[user_id] / remaining
+            remaining -= weights[user_id]
+        probabilities[order] = p
+    return probabilities
+
+
+def chi_square_critical(df, z=3.09):
+    """Wilson-Hilferty approximation of the chi-square quantile (z=3.09 is p = 0.001)"""
+    return df * (1 - 2 / (9 * df) + z * math.sqrt(2 / (9 * df))) ** 3
+
+
+def assert_matches(counts, probabilities, trials):
+    assert set(counts) <= set(probabilities)
+    statistic = sum(
+        (counts.get(outcome, 0) - p * trials) ** 2 / (p * trials)
+        for outcome, p in probabilities.items()
+    )
+    assert statistic < chi_square_critical(len(probabilities) - 1), statistic
+
+
+def test_single_winner_matches_expanded_pool():
+    probabilities = exact_probabilities(WEIGHTS, 1)
+    rng = random.Random(1)
+    sampled = Counter(tuple(draw_winners(WEIGHTS, 1, rng)[0]) for _ in range(TRIALS))
+    rng = random.Random(2)
+    baseline = Counter(tuple(expanded_pool_draw(WEIGHTS, 1, rng)) for _ in range(TRIALS))
+    assert_matches(sampled, probabilities, TRIALS)
+    assert_matches(baseline, probabilities, TRIALS)
+
+
+def test_ordered_winners_match_expanded_pool():
+    probabilities = exact_probabilities(WEIGHTS, 3)
+    rng = random.Random(3)
+    sampled = Counter(tuple(draw_winners(WEIGHTS, 3, rng)[0]) for _ in range(TRIALS))
+    rng = random.Random(4)
+    baseline = Counter(tuple(expanded_pool_draw(WEIGHTS, 3, rng)) for _ in range(TRIALS))
+    assert_matches(sampled, probabilities, TRIALS)
+    assert_matches(baseline, probabilities, TRIALS)
+
+
+def test_total_counts_only_positive_tickets():
+    _, total = draw_winners(WEIGHTS + [(107, -2)], 1, random.Random(0))
+    assert total == 12
+
+
+def test_more_winners_than_entrants_returns_everyone_once():
+    winners, total = draw_winners(WEIGHTS, 10, random.Random(0))
+    assert sorted(winners) == [101, 102, 103, 104, 105]
+    assert total == 12
+
+
+def test_winners_are_distinct():
+    rng = random.Random(5)
+    for _ in range(1000):
+        winners, _ = draw_winners(WEIGHTS, 4, rng)
+        assert len(winners) == len(set(winners)) == 4
+
+
+def test_zero_ticket_users_never_win():
+    rng = random.Random(6)
+    for _ in range(1000):
+        assert 106 not in draw_winners(WEIGHTS, 5, rng)[0]
+
+
+def test_single_one_ticket_entrant_always_wins():
+    assert draw_winners([(1, 0), (2, 1), (3, 0)], 3, random.Random(0)) == ([2], 1)
+
+
+def test_no_eligible_entrants():
+    assert draw_winners([], 1, random.Random(0)) == ([], 0)
+    assert draw_winners([(1, 0), (2, 0)], 2, random.Random(0)) == ([], 0)
+
+
+def test_zero_winners():
+    assert draw_winners(WEIGHTS, 0, random.Random(0)) == ([], 12)
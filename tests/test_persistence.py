@@ -0,0 +1,90 @@
+"""WriteBehindStore over JsonBackend: journal replay, torn lines and compaction."""
+import asyncio
+import json
+import os
+
+from persistence import WriteBehindStore
+from storage import JsonBackend
+
+
+def make_store(directory, entries, compact_bytes):
+    backend = JsonBackend(str(directory), compact_bytes=compact_bytes)
+    store = WriteBehindStore(backend, interval=60)
+    store.register('entries', lambda: entries, journaled=True)
+    return backend, store
+
+
+def enter(store, entries, user):
+    entries.setdefault('1', {}).setdefault('g', []).append(user)
+    store.append('entries', {'guild': '1', 'giveaway': 'g', 'user': user, 'ts': 0})
+
+
+def test_journaled_entries_survive_a_restart(tmp_path):
+    entries = {}
+    backend, store = make_store(tmp_path, entries, compact_bytes=1024 * 1024)
+    for user in ('10', '11', '10'):
+        enter(store, entries, user)
+    asyncio.run(store.flush())
+
+    assert not os.path.exists(backend.paths['entries'])  # Only the journal was written
+    assert JsonBackend(str(tmp_path)).load()['entries'] == {'1': {'g': ['10', '11']}}
+
+
+def test_torn_last_journal_line_is_skipped(tmp_path):
+    entries = {}
+    backend, store = make_store(tmp_path, entries, compact_bytes=1024 * 1024)
+    enter(store, entries, '10')
+    enter(store, entries, '11')
+    store.flush_sync()
+    with open(backend.journal_paths['entries'], 'a') as f:
+        f.write('{"guild": "1", "giveaway": "g", "us')  # Crash mid-append
+
+    assert JsonBackend(str(tmp_path)).load()['entries'] == {'1': {'g': ['10', '11']}}
+
+
+def test_compaction_writes_a_snapshot_and_truncates_the_journal(tmp_path):
+    entries = {}
+    backend, store = make_store(tmp_path, entries, compact_bytes=200)
+    enter(store, entries, '10')
+    store.flush_sync()
+    assert os.path.getsize(backend.journal_paths['entries']) > 0
+
+    for user in range(11, 20):
+        enter(store, entries, str(user))
+    store.flush_sync()  # The journal would pass compact_bytes, so the whole dataset is snapshotted
+    assert backend.compactions == 1
+    assert os.path.getsize(backend.journal_paths['entries']) == 0
+    with open(backend.paths['entries']) as f:
+        assert json.load(f) == {'1': {'g': [str(user) for user in range(10, 20)]}}
+
+    # New entries journal again on top of the snapshot
+    enter(store, entries, '20')
+    store.flush_sync()
+    assert JsonBackend(str(tmp_path)).load()['entries'] == {'1': {'g': [str(user) for user in range(10, 21)]}}
+
+
+def test_failed_write_is_retried_as_a_snapshot(tmp_path):
+    entries = {}
+    backend, store = make_store(tmp_path, entries, compact_bytes=1024 * 1024)
+    write = backend.write
+    calls = []
+
+    def failing_write(snapshots, journals):
+        calls.append((set(snapshots), set(journals)))
+        if len(calls) == 1:
+            raise OSError('disk full')
+        write(snapshots, journals)
+
+    backend.write = failing_write
+    enter(store, entries, '10')
+
+    async def flush_twice():
+        try:
+            await store.flush()
+        except OSError:
+            pass
+        await store.flush()
+
+    asyncio.run(flush_twice())
+    assert calls == [(set(), {'entries'}), ({'entries'}, set())]
+    assert JsonBackend(str(tmp_path)).load()['entries'] == {'1': {'g': ['10']}}
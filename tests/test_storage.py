@@ -0,0 +1,92 @@
+"""SqliteBackend: the one-shot JSON migration, row diffs and guild-filtered loads."""
+import json
+import os
+
+from storage import SqliteBackend, migrate_json_to_sqlite
+
+GIVEAWAY = {'active': True, 'prize': 'Nitro', 'end_time': '2030-01-01T00:00:00', 'winners': 1}
+
+
+def write_json(directory, name, data):
+    with open(os.path.join(directory, name), 'w') as f:
+        json.dump(data, f)
+
+
+def rows(backend, table):
+    return backend.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_migration_drops_legacy_entries_and_duplicates(tmp_path):
+    write_json(tmp_path, 'giveaway_data.json', {'1': {'active': False}, '2': {'g1': GIVEAWAY}})
+    write_json(tmp_path, 'entries_data.json', {'1': ['10', '11'], '2': {'g1': ['10', '11', '10']}})
+    write_json(tmp_path, 'invite_data.json', {'2': {'10': {'invites': 3}, '11': {'invites': 0, 'manual_bonus': 2}}})
+    with open(tmp_path / 'entries_journal.ndjson', 'w') as f:
+        f.write(json.dumps({'guild': '2', 'giveaway': 'g1', 'user': '12'}) + '\n')
+
+    backend = SqliteBackend(str(tmp_path / 'bot.db'))
+    assert migrate_json_to_sqlite(str(tmp_path), backend) == (1, 3, 2)
+    data = backend.load()
+    assert data['giveaways'] == {'2': {'g1': GIVEAWAY}}
+    assert data['entries'] == {'2': {'g1': ['10', '11', '12']}}
+    assert data['invites'] == {'2': {'10': {'invites': 3}, '11': {'invites': 0, 'manual_bonus': 2}}}
+
+
+def test_first_load_migrates_once(tmp_path):
+    write_json(tmp_path, 'entries_data.json', {'2': {'g1': ['10']}})
+    write_json(tmp_path, 'giveaway_data.json', {'2': {'g1': GIVEAWAY}})
+    assert SqliteBackend(str(tmp_path / 'bot.db'), data_dir=str(tmp_path)).load()['entries'] == {'2': {'g1': ['10']}}
+
+    # Later changes to the JSON files are ignored once the database exists
+    write_json(tmp_path, 'entries_data.json', {'2': {'g1': ['10', '99']}})
+    assert SqliteBackend(str(tmp_path / 'bot.db'), data_dir=str(tmp_path)).load()['entries'] == {'2': {'g1': ['10']}}
+
+
+def test_write_only_touches_changed_rows(tmp_path):
+    backend = SqliteBackend(str(tmp_path / 'bot.db'))
+    backend.load()
+    invites = {'2': {str(user_id): {'invites': user_id} for user_id in range(100)}}
+    backend.write({'invites': invites, 'giveaways': {'2': {'g1': GIVEAWAY, 'g2': GIVEAWAY}}, 'entries': {'2': {'g1': ['1', '2']}}}, {})
+
+    changes = backend.conn.total_changes
+    invites = {'2': dict(invites['2'], **{'5': {'invites': 6, 'manual_bonus': 1}})}
+    backend.write({'invites': invites}, {})
+    assert backend.conn.total_changes - changes == 1
+
+    changes = backend.conn.total_changes
+    backend.write({}, {'entries': [{'guild': '2', 'giveaway': 'g1', 'user': '3', 'ts': 1.0}]})
+    assert backend.conn.total_changes - changes == 1
+
+    changes = backend.conn.total_changes
+    backend.write({'giveaways': {'2': {'g1': GIVEAWAY}}}, {})
+    assert backend.conn.total_changes - changes == 1
+
+    data = SqliteBackend(str(tmp_path / 'bot.db')).load()
+    assert data['invites']['2']['5'] == {'invites': 6, 'manual_bonus': 1}
+    assert data['entries']['2']['g1'] == ['1', '2', '3']
+    assert list(data['giveaways']['2']) == ['g1']
+
+
+def test_guild_filter_loads_and_writes_only_owned_guilds(tmp_path):
+    path = str(tmp_path / 'bot.db')
+    backend = SqliteBackend(path)
+    backend.load()
+    backend.write({
+        'giveaways': {'1': {'a': GIVEAWAY}, '2': {'b': GIVEAWAY}},
+        'entries': {'1': {'a': ['10']}, '2': {'b': ['20']}},
+        'invites': {'1': {'10': {'invites': 1}}, '2': {'20': {'invites': 2}}},
+        'tracking': {'1': {'11': '10'}, '2': {'21': '20'}},
+    }, {})
+
+    owned = SqliteBackend(path, guild_filter=lambda guild_id: guild_id == '2')
+    data = owned.load()
+    assert data['giveaways'] == {'2': {'b': GIVEAWAY}}
+    assert data['entries'] == {'2': {'b': ['20']}}
+    assert data['invites'] == {'2': {'20': {'invites': 2}}}
+    assert data['tracking'] == {'2': {'21': '20'}}
+
+    # Writing the owned partition back, even emptied, leaves the other guild alone
+    owned.write({'invites': {}, 'entries': {'2': {'b': ['20', '21']}}}, {})
+    data = SqliteBackend(path).load()
+    assert data['invites'] == {'1': {'10': {'invites': 1}}}
+    assert data['entries'] == {'1': {'a': ['10']}, '2': {'b': ['20', '21']}}
+    assert rows(owned, 'giveaways') == 2
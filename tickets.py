@@ -0,0 +1,175 @@
+from itertools import islice
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # Optional, only speeds up totals and ranking for huge giveaways
+
+
+class TicketCache:
+    """Materialized ticket bonuses per (guild_id, user_id), both ints.
+
+    Holds the computed (invite_bonus, manual_bonus, role_bonus) for each user so hot paths
+    read one dict entry instead of looking up the guild, member and roles again. Entries
+    are dropped by invalidate() whenever one of their inputs changes: role updates,
+    invite credits/deductions, manual bonus edits and joins/leaves.
+    """
+
+    def __init__(self, compute):
+        self._compute = compute  # compute(guild_id, user_id) -> (invite_bonus, manual_bonus, role_bonus)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, guild_id, user_id):
+        """(invite_bonus, manual_bonus, role_bonus) for a user"""
+        key = (guild_id, user_id)
+        components = self._entries.get(key)
+        if components is not None:
+            self.hits += 1
+            return components
+        self.misses += 1
+        components = self._compute(guild_id, user_id)
+        self._entries[key] = components
+        return components
+
+    def invalidate(self, guild_id, user_id):
+        self._entries.pop((guild_id, user_id), None)
+
+    def invalidate_guild(self, guild_id):
+        for key in [key for key in self._entries if key[0] == guild_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class TicketWeights:
+    """Aligned user IDs and ticket counts for one giveaway's eligible entrants.
+
+    Uses NumPy arrays for the totals and ranking when NumPy is installed, plain lists
+    otherwise.
+    """
+
+    def __init__(self, user_ids, weights):
+        self.user_ids = user_ids
+        self.weights = weights
+        if numpy is not None:
+            self._weights_array = numpy.fromiter(weights, dtype=numpy.int64, count=len(weights))
+            self.total = int(self._weights_array.clip(min=0).sum())
+        else:
+            self.total = sum(w for w in weights if w > 0)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def pairs(self):
+        """(user_id, tickets) pairs, e.g. for draw.draw_winners()"""
+        return zip(self.user_ids, self.weights)
+
+    def ranked(self):
+        """Indices ordered by tickets, most first; ties keep entry order"""
+        if numpy is not None:
+            return numpy.argsort(-self._weights_array, kind='stable').tolist()
+        weights = self.weights
+        return sorted(range(len(weights)), key=weights.__getitem__, reverse=True)
+
+
+def evaluate_entrants(guild, entrants, bonuses):
+    """Tickets for every entrant still in the guild, skipping bots and members who left.
+
+    entrants are the giveaway's int user IDs; bonuses(guild_id, user_id) returns the
+    cached (invite_bonus, manual_bonus, role_bonus). Lookups are hoisted out of the loop.
+    """
+    guild_id = guild.id
+    get_member = guild.get_member
+    user_ids = []
+    weights = []
+    append_user = user_ids.append
+    append_weight = weights.append
+    for user_id in entrants:
+        member = get_member(user_id)
+        if member is None or member.bot:
+            continue
+        invite_bonus, manual_bonus, role_bonus = bonuses(guild_id, user_id)
+        append_user(user_id)
+        append_weight(1 + invite_bonus + manual_bonus + role_bonus)
+    return TicketWeights(user_ids, weights)
+
+
+class TicketRanking:
+    """Entrants of one giveaway bucketed by ticket count, kept up to date incrementally.
+
+    Tickets are small integers, so users live in {tickets: {user_id: None}} buckets and
+    a page is read by walking the few bucket keys from the top. Changes only mark users
+    dirty; they are re-bucketed (O(1) each) the next time the ranking is read. Within a
+    bucket users keep entry order, except that a user whose tickets changed moves to the
+    end of their new bucket.
+    """
+
+    def __init__(self, weights, tickets_for):
+        self._tickets_for = tickets_for  # tickets_for(user_id) -> tickets, or None if not eligible
+        self._buckets = {}
+        self._tickets = {}
+        self._dirty = set()
+        self.total = 0
+        for i in weights.ranked():
+            self._place(weights.user_ids[i], weights.weights[i])
+
+    def _place(self, user_id, tickets):
+        self._buckets.setdefault(tickets, {})[user_id] = None
+        self._tickets[user_id] = tickets
+        if tickets > 0:
+            self.total += tickets
+
+    def _remove(self, user_id):
+        tickets = self._tickets.pop(user_id, None)
+        if tickets is None:
+            return
+        bucket = self._buckets[tickets]
+        del bucket[user_id]
+        if not bucket:
+            del self._buckets[tickets]
+        if tickets > 0:
+            self.total -= tickets
+
+    def mark_dirty(self, user_id):
+        """Re-check a user's tickets (or eligibility) on the next read"""
+        self._dirty.add(user_id)
+
+    def _refresh(self):
+        dirty, self._dirty = self._dirty, set()
+        for user_id in dirty:
+            tickets = self._tickets_for(user_id)
+            if tickets == self._tickets.get(user_id):
+                continue
+            self._remove(user_id)
+            if tickets is not None:
+                self._place(user_id, tickets)
+
+    def __len__(self):
+        self._refresh()
+        return len(self._tickets)
+
+    def page(self, start, count):
+        """[(user_id, tickets)] for ranks start .. start + count - 1"""
+        self._refresh()
+        rows = []
+        for tickets in sorted(self._buckets, reverse=True):
+            bucket = self._buckets[tickets]
+            if start >= len(bucket):
+                start -= len(bucket)
+                continue
+            for user_id in islice(bucket, start, start + count - len(rows)):
+                rows.append((user_id, tickets))
+            start = 0
+            if len(rows) >= count:
+                break
+        return rows